@@ -0,0 +1,214 @@
+"""Benchmarks for the simulation hot paths.
+
+Measures the throughput of the physics, controller and rendering code at
+several batch sizes. Results can be saved as JSON and compared against a
+saved baseline to catch performance regressions, e.g.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json --threshold .1
+
+The comparison exits with a non-zero status if any benchmark is more than
+`threshold` slower than its baseline.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import physics
+import simulator as sim
+from controller import BatchPIDController
+from controller import OnOffController
+from controller import PIDController
+
+BATCH_SIZES = (1, 100, 10000)
+
+
+def _measure(tick, min_time=.2, repeats=7, warmup_time=.2):
+    """Returns the median number of calls per second of tick over repeats runs.
+
+    A warm-up run of warmup_time seconds, whose result is discarded, first
+    fills caches and lets the CPU clock ramp up. Each timed run then calls
+    tick until at least min_time seconds have elapsed. The median is robust
+    to the occasional run disturbed by other processes.
+    """
+    def run(min_time):
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0.
+        while elapsed < min_time:
+            for _ in range(10):
+                tick()
+            calls += 10
+            elapsed = time.perf_counter() - start
+        return calls / elapsed
+
+    run(warmup_time)
+    return float(np.median([run(min_time) for _ in range(repeats)]))
+
+
+def bench_rocket_update(batch_size):
+    controller = PIDController(setpoint=sim.TARGET_Y, kp=1., ki=.0001, kd=2.3)
+    if batch_size == 1:
+        rocket = sim.Rocket(pos=(sim.WIDTH/2, sim.GROUND_Y),
+                            controller=controller)
+    else:
+        controller = BatchPIDController(setpoint=sim.TARGET_Y, kp=1.,
+                                        ki=.0001, kd=2.3, size=batch_size)
+        pos = np.tile((sim.WIDTH/2, sim.GROUND_Y), (batch_size, 1))
+        rocket = sim.RocketBatch(pos=pos, controller=controller)
+    return _measure(lambda: rocket.update(sim.DT))
+
+
+def bench_pid_tick(batch_size):
+    if batch_size == 1:
+        controller = PIDController(setpoint=sim.TARGET_Y, kp=1., ki=.0001,
+                                   kd=2.3)
+        process_var = float(sim.GROUND_Y)
+    else:
+        controller = BatchPIDController(setpoint=sim.TARGET_Y, kp=1.,
+                                        ki=.0001, kd=2.3, size=batch_size)
+        process_var = np.full(batch_size, float(sim.GROUND_Y))
+    return _measure(lambda: controller.tick(process_var, sim.DT))
+
+
+def bench_onoff_tick(batch_size):
+    controller = OnOffController(setpoint=sim.TARGET_Y)
+    process_var = (float(sim.GROUND_Y) if batch_size == 1 else
+                   np.full(batch_size, float(sim.GROUND_Y)))
+    return _measure(lambda: controller.tick(process_var, sim.DT))
+
+
+def bench_rigid_body_update(batch_size):
+    if batch_size == 1:
+        body = physics.RigidBody(mass=100, moment_of_inertia=100,
+                                 position=(100, 100))
+        return _measure(lambda: body.update(sim.DT))
+    world = physics.RigidBodyWorld(capacity=batch_size)
+    for i in range(batch_size):
+        world.add_body(mass=100, moment_of_inertia=100, position=(i, 100))
+    return _measure(lambda: world.update(sim.DT))
+
+
+class Skipped(Exception):
+    """Raised by benchmarks which can not run in the current environment."""
+
+
+def bench_draw_cycle(batch_size):
+    """Measures frames per second of drawing batch_size rockets."""
+    try:
+        import graphics as g
+    except ImportError as e:
+        raise Skipped(e)
+    try:
+        window = g.GraphWin(sim.TITLE, sim.WIDTH, sim.HEIGHT, autoflush=False)
+    except g.tk.TclError as e:
+        raise Skipped(e)
+    try:
+        rockets = [sim.Rocket(pos=(x, sim.GROUND_Y))
+                   for x in np.linspace(0, sim.WIDTH, batch_size)]
+        for rocket in rockets:
+            rocket.set_thrust(.5)
+            window.drawAll(rocket.drawables())
+
+        def frame():
+            for rocket in rockets:
+                rocket.update(sim.DT)
+                rocket.update_drawables()
+            g.update()
+
+        return _measure(frame)
+    finally:
+        window.close()
+
+
+# The name and function of each benchmark. Functions return calls per second
+# which `run` converts to simulated items per second.
+BENCHMARKS = (('rocket_update', bench_rocket_update),
+              ('pid_tick', bench_pid_tick),
+              ('onoff_tick', bench_onoff_tick),
+              ('rigid_body_update', bench_rigid_body_update),
+              ('draw_cycle', bench_draw_cycle))
+
+
+def run(names=None, batch_sizes=BATCH_SIZES):
+    """Runs the benchmarks.
+
+    Args:
+        names: The names of the benchmarks to run. Defaults to all of them.
+        batch_sizes: The batch sizes to run each benchmark at.
+
+    Returns:
+        A dict mapping "<name>/<batch_size>" to the number of items (e.g.
+        rocket ticks or frames) processed per second. Benchmarks which can not
+        run in the current environment, e.g. drawing without a display, are
+        skipped.
+    """
+    results = {}
+    for name, bench in BENCHMARKS:
+        if names and name not in names:
+            continue
+        for batch_size in batch_sizes:
+            key = '{}/{}'.format(name, batch_size)
+            try:
+                calls_per_second = bench(batch_size)
+            except Skipped as e:
+                print('{:<28} skipped ({})'.format(key, e))
+                continue
+            items = 1 if name == 'draw_cycle' else batch_size
+            results[key] = calls_per_second * items
+            print('{:<28} {:>16,.0f} /s'.format(key, results[key]))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Compares results against a baseline.
+
+    Returns:
+        The list of (key, result, baseline) tuples which regressed by more
+        than the threshold fraction.
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+        change = result / baseline[key] - 1
+        print('{:<28} {:>+8.1%}'.format(key, change))
+        if change < -threshold:
+            regressions.append((key, result, baseline[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--benchmarks', nargs='*',
+                        choices=[name for name, _ in BENCHMARKS],
+                        help='The benchmarks to run. Defaults to all.')
+    parser.add_argument('--batch_sizes', nargs='*', type=int,
+                        default=BATCH_SIZES)
+    parser.add_argument('--output', help='Where to save the JSON results.')
+    parser.add_argument('--baseline', help='The JSON results to compare to.')
+    parser.add_argument('--threshold', type=float, default=.1,
+                        help='The allowed fractional slowdown.')
+    args = parser.parse_args(argv)
+
+    results = run(args.benchmarks, args.batch_sizes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for key, result, expected in regressions:
+            print('REGRESSION {}: {:,.0f} /s vs {:,.0f} /s baseline'.format(
+                    key, result, expected))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Collision detection and response for `physics.RigidBody` instances.
+
+Collisions are found in two phases. The broad phase buckets the bounding box
+of every body into a uniform grid (a spatial hash) and only pairs up bodies
+which share a cell, so the work grows roughly linearly with the number of
+bodies instead of quadratically. The narrow phase then tests the surviving
+pairs exactly using the separating axis theorem. Contacts are resolved with
+impulses and a small positional correction which stops bodies from sinking
+into each other.
+"""
+
+import collections
+import math
+
+import numpy as np
+
+Contact = collections.namedtuple(
+        'Contact', ['a', 'b', 'normal', 'depth', 'point'])
+Contact.__doc__ = """A contact between bodies a and b.
+
+The normal points from a to b and depth is the penetration distance along it.
+"""
+
+
+def _rotation_matrix(rotation):
+    c, s = math.cos(rotation), math.sin(rotation)
+    return np.array([[c, -s], [s, c]])
+
+
+class AABB(object):
+    """An axis aligned box which ignores the rotation of its body."""
+
+    def __init__(self, width, height):
+        """Initializes a new AABB instance.
+
+        Args:
+            width: The width of the box.
+            height: The height of the box.
+        """
+        hw, hh = width / 2, height / 2
+        self._corners = np.array([(-hw, -hh), (hw, -hh), (hw, hh), (-hw, hh)])
+
+    def axes(self, rotation):
+        """Returns the (2, 2) array of the box's edge normals."""
+        del rotation  # Unused.
+        return np.eye(2)
+
+    def corners(self, position, rotation):
+        """Returns the (4, 2) array of the box's corners in world coordinates."""
+        del rotation  # Unused.
+        return self._corners + position
+
+    def bounds(self, position, rotation):
+        """Returns the (low, high) corners of the box's world bounding box."""
+        corners = self.corners(position, rotation)
+        return corners.min(axis=0), corners.max(axis=0)
+
+
+class OBB(AABB):
+    """An oriented box which rotates with its body."""
+
+    def axes(self, rotation):
+        return _rotation_matrix(rotation).T
+
+    def corners(self, position, rotation):
+        return np.dot(self._corners, _rotation_matrix(rotation).T) + position
+
+
+def _contains(corners, axes, points):
+    """Returns which points are inside the box with the given corners."""
+    box = np.dot(corners, axes.T)
+    projections = np.dot(points, axes.T)
+    return np.all((projections >= box.min(axis=0)) &
+                  (projections <= box.max(axis=0)), axis=1)
+
+
+def collide(shape_a, position_a, rotation_a, shape_b, position_b, rotation_b):
+    """Tests two shapes for overlap using the separating axis theorem.
+
+    Returns:
+        None if the shapes do not overlap, otherwise the (normal, depth,
+        point) tuple describing the contact. The normal points from a to b.
+    """
+    corners_a = shape_a.corners(position_a, rotation_a)
+    corners_b = shape_b.corners(position_b, rotation_b)
+    axes = np.concatenate((shape_a.axes(rotation_a),
+                           shape_b.axes(rotation_b)))
+
+    projections_a = np.dot(corners_a, axes.T)
+    projections_b = np.dot(corners_b, axes.T)
+    overlaps = (np.minimum(projections_a.max(axis=0),
+                           projections_b.max(axis=0)) -
+                np.maximum(projections_a.min(axis=0),
+                           projections_b.min(axis=0)))
+    if np.any(overlaps <= 0):
+        return None
+
+    i = np.argmin(overlaps)
+    normal = axes[i]
+    if np.dot(position_b - position_a, normal) < 0:
+        normal = -normal
+
+    # Use the average of the corners of each box inside the other as the
+    # contact point, e.g. the middle of a box resting flat on another box.
+    axes_a, axes_b = axes[:2], axes[2:]
+    inside = np.concatenate((corners_b[_contains(corners_a, axes_a, corners_b)],
+                             corners_a[_contains(corners_b, axes_b, corners_a)]))
+    if len(inside):
+        point = inside.mean(axis=0)
+    else:
+        # Edge on edge overlap, use the middle of the overlapping region.
+        point = (corners_a.mean(axis=0) + corners_b.mean(axis=0)) / 2
+    return normal, overlaps[i], point
+
+
+class SpatialHash(object):
+    """A uniform grid broad phase.
+
+    The cell size should be on the order of the size of a typical body. Much
+    smaller cells make large bodies span many cells while much larger cells
+    put many bodies in the same cell.
+    """
+
+    def __init__(self, cell_size):
+        self._cell_size = cell_size
+
+    def pairs(self, bounds):
+        """Finds all pairs of overlapping bounding boxes.
+
+        Args:
+            bounds: A list of (low, high) bounding box corners.
+
+        Returns:
+            The sorted list of (i, j) index pairs, i < j, of overlapping boxes.
+        """
+        cells = collections.defaultdict(list)
+        pairs = set()
+        for i, (low, high) in enumerate(bounds):
+            x0, y0 = np.floor_divide(low, self._cell_size).astype(int)
+            x1, y1 = np.floor_divide(high, self._cell_size).astype(int)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    cell = cells[cx, cy]
+                    for j in cell:
+                        other_low, other_high = bounds[j]
+                        if (np.all(low <= other_high) and
+                                np.all(other_low <= high)):
+                            pairs.add((j, i))
+                    cell.append(i)
+        return sorted(pairs)
+
+
+class Collider(object):
+    """Detects and resolves collisions between rigid bodies.
+
+    Bodies without a shape are ignored. Static (infinite mass) bodies collide
+    with dynamic bodies but never with each other.
+    """
+
+    def __init__(self, cell_size=50., restitution=.5, correction=.8,
+                 slop=.01):
+        """Initializes a new Collider instance.
+
+        Args:
+            cell_size: The cell size of the spatial hash broad phase.
+            restitution: The coefficient of restitution in [0, 1], i.e. how
+                bouncy collisions are.
+            correction: The fraction of the penetration depth corrected every
+                time a contact is resolved.
+            slop: The penetration depth which is allowed without correction.
+                Prevents jitter for bodies resting on each other.
+        """
+        self._broad_phase = SpatialHash(cell_size)
+        self._restitution = restitution
+        self._correction = correction
+        self._slop = slop
+
+    def detect(self, bodies):
+        """Returns the list of Contacts between the bodies."""
+        bodies = [body for body in bodies if body.shape is not None]
+        bounds = [body.shape.bounds(body.position, body.rotation)
+                  for body in bodies]
+        contacts = []
+        for i, j in self._broad_phase.pairs(bounds):
+            a, b = bodies[i], bodies[j]
+            if a.is_static and b.is_static:
+                continue
+            contact = collide(a.shape, a.position, a.rotation,
+                              b.shape, b.position, b.rotation)
+            if contact is not None:
+                contacts.append(Contact(a, b, *contact))
+        return contacts
+
+    def resolve(self, contacts):
+        """Applies collision impulses and positional corrections."""
+        for contact in contacts:
+            a, b, normal, depth, point = contact
+            inv_mass_a = 0. if a.is_static else 1. / a.mass
+            inv_mass_b = 0. if b.is_static else 1. / b.mass
+            arm_a = point - a.position
+            arm_b = point - b.position
+
+            # Velocities of the contact point on each body.
+            velocity_a = a.velocity + a.angular_velocity * np.array(
+                    (-arm_a[1], arm_a[0]))
+            velocity_b = b.velocity + b.angular_velocity * np.array(
+                    (-arm_b[1], arm_b[0]))
+            closing = np.dot(velocity_b - velocity_a, normal)
+            if closing < 0:
+                cross_a = arm_a[0] * normal[1] - arm_a[1] * normal[0]
+                cross_b = arm_b[0] * normal[1] - arm_b[1] * normal[0]
+                inv_inertia_a = (0. if a.is_static else
+                                 cross_a ** 2 / a.moment_of_inertia)
+                inv_inertia_b = (0. if b.is_static else
+                                 cross_b ** 2 / b.moment_of_inertia)
+                j = (-(1 + self._restitution) * closing /
+                     (inv_mass_a + inv_mass_b + inv_inertia_a + inv_inertia_b))
+                a.apply_impulse(-j * normal, point)
+                b.apply_impulse(j * normal, point)
+
+            correction = (max(depth - self._slop, 0) * self._correction /
+                          (inv_mass_a + inv_mass_b))
+            a.translate(-correction * inv_mass_a * normal)
+            b.translate(correction * inv_mass_b * normal)
+
+    def step(self, bodies):
+        """Detects and resolves collisions between the bodies.
+
+        Returns:
+            The list of resolved Contacts.
+        """
+        contacts = self.detect(bodies)
+        self.resolve(contacts)
+        return contacts
@@ -7,6 +7,9 @@ import numpy as np
 class Controller(object):
     """Abstract Controller class meant to be subclassed by all controllers."""
 
+    # The size of the flat state returned by `get_state`.
+    STATE_SIZE = 0
+
     def __init__(self, setpoint):
         """Initializes a new Controller instance.
 
@@ -35,6 +38,32 @@ class Controller(object):
             process.
         """
 
+    def get_state(self, out=None):
+        """Returns the controller's internal state as a flat float64 array.
+
+        Args:
+            out: An optional (STATE_SIZE,) array to write the state to.
+        """
+        return np.empty(self.STATE_SIZE) if out is None else out
+
+    def set_state(self, state):
+        """Restores the internal state returned by `get_state`."""
+        del state  # Unused, stateless controllers have nothing to restore.
+
+    def fork(self, state, n):
+        """Returns a controller which drives n processes from the given state.
+
+        The returned controller's `tick` accepts and returns (n,) arrays. By
+        default controllers are assumed to be stateless and to work on arrays,
+        in which case the controller itself is returned.
+
+        Args:
+            state: The flat state returned by `get_state`.
+            n: The number of processes to drive.
+        """
+        del state, n  # Unused.
+        return self
+
 
 class OnOffController(Controller):
     """An on-off (or bang-bang) hover controller.
@@ -59,6 +88,10 @@ class PIDController(Controller):
     The derivative is similarly approximated by taking the slope between the 
     errors at the current and previous instantaneous timesteps.
     """
+
+    # The previous error and the error integral.
+    STATE_SIZE = 2
+
     def __init__(self, setpoint, kp=1., ki=0., kd=1.):
         """Initializes a new PIDController instance.
         
@@ -77,6 +110,25 @@ class PIDController(Controller):
         self._error_previous = 0
         self._error_integral = 0
 
+    def get_state(self, out=None):
+        """Returns (error_previous, error_integral), see Controller."""
+        if out is None:
+            out = np.empty(self.STATE_SIZE)
+        out[0] = self._error_previous
+        out[1] = self._error_integral
+        return out
+
+    def set_state(self, state):
+        self._error_previous = float(state[0])
+        self._error_integral = float(state[1])
+
+    def fork(self, state, n):
+        """Returns a BatchPIDController of n copies in the given state."""
+        controller = BatchPIDController(setpoint=self._setpoint, kp=self._kp,
+                                        ki=self._ki, kd=self._kd, size=n)
+        controller.set_state(state)
+        return controller
+
     def tick(self, process_var, dt):
         error = self._error(process_var)
         self._error_integral += error * dt
@@ -86,3 +138,137 @@ class PIDController(Controller):
                 self._ki * self._error_integral + 
                 self._kd * derivative)
 
+
+class BatchPIDController(Controller):
+    """A bank of independent PID controllers evaluated together.
+
+    Behaves exactly like N separate `PIDController` instances but keeps the
+    gains, setpoints and state in arrays so that all N controllers are ticked
+    with a few vectorized operations.
+    """
+
+    STATE_SIZE = PIDController.STATE_SIZE
+
+    def __init__(self, setpoint, kp=1., ki=0., kd=1., size=None):
+        """Initializes a new BatchPIDController instance.
+
+        Args:
+            setpoint: The setpoints. Either a scalar shared by all controllers
+                or an array of shape (N,).
+            kp: The proportional weight constants, scalar or (N,) array.
+            ki: The integral weight constants, scalar or (N,) array.
+            kd: The derivative weight constants, scalar or (N,) array.
+            size: The number of controllers N. Only required if every other
+                argument is a scalar.
+        """
+        shape = np.broadcast_shapes(
+                *(np.shape(x) for x in (setpoint, kp, ki, kd)))
+        if size is not None:
+            shape = np.broadcast_shapes(shape, (size,))
+        if len(shape) != 1:
+            raise ValueError('Could not infer the number of controllers.')
+
+        def as_array(x):
+            return np.broadcast_to(
+                    np.asarray(x, dtype=np.float64), shape).copy()
+
+        super(BatchPIDController, self).__init__(setpoint=as_array(setpoint))
+        self._kp = as_array(kp)
+        self._ki = as_array(ki)
+        self._kd = as_array(kd)
+
+        self._error_previous = np.zeros(shape)
+        self._error_integral = np.zeros(shape)
+
+        # Scratch space reused every tick to avoid allocations.
+        self._error = np.empty(shape)
+        self._derivative = np.empty(shape)
+        self._output = np.empty(shape)
+
+    def __len__(self):
+        return len(self._setpoint)
+
+    def get_state(self, out=None):
+        """Returns the (N, STATE_SIZE) states, see PIDController.get_state."""
+        if out is None:
+            out = np.empty((len(self), self.STATE_SIZE))
+        out[:, 0] = self._error_previous
+        out[:, 1] = self._error_integral
+        return out
+
+    def set_state(self, state):
+        """Restores (N, STATE_SIZE) states, or one state for every controller.
+        """
+        state = np.asarray(state)
+        self._error_previous[:] = state[..., 0]
+        self._error_integral[:] = state[..., 1]
+
+    def fork(self, state, n):
+        """Returns a new BatchPIDController with the same gains and setpoints.
+
+        Args:
+            state: The (N, STATE_SIZE) states returned by `get_state`, or one
+                state shared by every controller.
+            n: The number of controllers, which must equal N since every
+                controller has its own gains.
+
+        Raises:
+            ValueError: If n or the state's shape does not match N.
+        """
+        if n != len(self):
+            raise ValueError('Expected n={}, got {}.'.format(len(self), n))
+        state = np.asarray(state)
+        if state.shape not in ((n, self.STATE_SIZE), (self.STATE_SIZE,)):
+            raise ValueError('Expected states of shape {}, got {}.'.format(
+                    (n, self.STATE_SIZE), state.shape))
+        controller = BatchPIDController(setpoint=self._setpoint, kp=self._kp,
+                                        ki=self._ki, kd=self._kd)
+        controller.set_state(state)
+        return controller
+
+    def reset(self, mask=None):
+        """Clears the integral and derivative state.
+
+        Args:
+            mask: An optional boolean (N,) array selecting which controllers to
+                reset. All controllers are reset if not provided.
+        """
+        if mask is None:
+            self._error_previous.fill(0)
+            self._error_integral.fill(0)
+        else:
+            self._error_previous[mask] = 0
+            self._error_integral[mask] = 0
+
+    def tick(self, process_var, dt, mask=None):
+        """Ticks every controller, see `Controller.tick`.
+
+        Args:
+            process_var: The (N,) array of measured process values.
+            dt: The elapsed time since the last tick, scalar or (N,) array.
+            mask: An optional boolean (N,) array selecting which controllers to
+                tick. Masked out controllers keep their state unchanged and
+                output 0.
+
+        Returns:
+            The (N,) array of control signals. The array is reused across
+            calls so callers should copy it if they need to keep it.
+        """
+        error = np.subtract(self._setpoint, process_var, out=self._error)
+        derivative = np.subtract(error, self._error_previous,
+                                 out=self._derivative)
+        derivative /= dt
+        if mask is None:
+            self._error_integral += error * dt
+            self._error_previous[:] = error
+        else:
+            np.add(self._error_integral, error * dt, out=self._error_integral,
+                   where=mask)
+            np.copyto(self._error_previous, error, where=mask)
+
+        output = np.multiply(self._kp, error, out=self._output)
+        output += self._ki * self._error_integral
+        output += self._kd * derivative
+        if mask is not None:
+            output[~mask] = 0
+        return output
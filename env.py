@@ -0,0 +1,297 @@
+"""Gym-style environments for learning rocket hover controllers.
+
+The agent observes the rocket's altitude error, vertical velocity and current
+thrust, and picks one of the rocket's 11 thrust levels every step. Rewards
+favor hovering at the target with little velocity and thrust.
+
+`RocketEnv` simulates a single rocket. `VecRocketEnv` steps K rockets in
+lockstep as a `simulator.RocketBatch` and `SubprocVecEnv` shards K rockets
+across worker processes which exchange observations and actions through
+shared memory.
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import simulator as sim
+
+NUM_ACTIONS = 11
+OBSERVATION_SIZE = 3
+
+# Reward shaping weights.
+ERROR_WEIGHT = 1.
+VELOCITY_WEIGHT = .1
+THRUST_WEIGHT = .01
+# Bonus for being within HOVER_BAND pixels of the target.
+HOVER_BONUS = 1.
+HOVER_BAND = 5.
+
+# Episodes terminate if the rocket flies off the top of the screen.
+CEILING_Y = 0.
+
+
+def _observe(position, velocity, thrust_percent, out):
+    """Writes (altitude error, vertical velocity, thrust) observations."""
+    out[..., 0] = sim.TARGET_Y - position[..., 1]
+    out[..., 1] = velocity[..., 1]
+    out[..., 2] = thrust_percent
+    return out
+
+
+def _reward(position, velocity, thrust_percent):
+    """Computes shaped hover rewards, see the module docstring."""
+    error = np.abs(sim.TARGET_Y - position[..., 1])
+    initial_error = sim.GROUND_Y - sim.TARGET_Y
+    return (-ERROR_WEIGHT * error / initial_error
+            - VELOCITY_WEIGHT * np.abs(velocity[..., 1]) / initial_error
+            - THRUST_WEIGHT * thrust_percent
+            + HOVER_BONUS * (error < HOVER_BAND))
+
+
+class RocketEnv(object):
+    """A single rocket hover environment.
+
+    Observations are float32 arrays of shape (OBSERVATION_SIZE,) and actions
+    are integer thrust levels in [0, NUM_ACTIONS).
+    """
+
+    def __init__(self, dt=sim.DT, max_steps=2400):
+        """Initializes a new RocketEnv instance.
+
+        Args:
+            dt: The simulated time per step.
+            max_steps: The number of steps after which an episode ends.
+        """
+        self._dt = dt
+        self._max_steps = max_steps
+        self._rocket = None
+        self._steps = 0
+        self._obs = np.zeros(OBSERVATION_SIZE, dtype=np.float32)
+
+    def reset(self):
+        """Starts a new episode with the rocket at rest on the ground.
+
+        Returns:
+            The initial observation.
+        """
+        self._rocket = sim.Rocket(pos=(sim.WIDTH/2, sim.GROUND_Y))
+        self._steps = 0
+        return _observe(self._rocket.position, self._rocket.velocity, 0.,
+                        self._obs).copy()
+
+    def step(self, action):
+        """Applies the action for one step.
+
+        Returns:
+            The (observation, reward, done, info) tuple.
+        """
+        rocket = self._rocket
+        rocket.set_thrust(int(action) / (NUM_ACTIONS - 1))
+        rocket.update(self._dt)
+        self._steps += 1
+        obs = _observe(rocket.position, rocket.velocity, rocket.thrust_percent,
+                       self._obs).copy()
+        reward = float(_reward(rocket.position, rocket.velocity,
+                               rocket.thrust_percent))
+        crashed = rocket.position[1] < CEILING_Y
+        done = bool(crashed or self._steps >= self._max_steps)
+        return obs, reward, done, {'steps': self._steps}
+
+
+class VecRocketEnv(object):
+    """K rocket hover environments stepped in lockstep.
+
+    Environments which finish an episode are reset automatically, the returned
+    observation for them is the first observation of the new episode.
+    """
+
+    def __init__(self, num_envs, dt=sim.DT, max_steps=2400):
+        """Initializes a new VecRocketEnv instance.
+
+        Args:
+            num_envs: The number of environments K.
+            dt: The simulated time per step.
+            max_steps: The number of steps after which an episode ends.
+        """
+        self._num_envs = num_envs
+        self._dt = dt
+        self._max_steps = max_steps
+        self._start = (sim.WIDTH/2, sim.GROUND_Y)
+        self._rockets = sim.RocketBatch(np.tile(self._start, (num_envs, 1)))
+        self._steps = np.zeros(num_envs, dtype=np.int64)
+        self._obs = np.zeros((num_envs, OBSERVATION_SIZE), dtype=np.float32)
+
+    @property
+    def num_envs(self):
+        return self._num_envs
+
+    def reset(self):
+        """Resets every environment.
+
+        Returns:
+            The (K, OBSERVATION_SIZE) array of initial observations.
+        """
+        rockets = self._rockets
+        rockets.reset(self._start)
+        self._steps[:] = 0
+        return _observe(rockets.position, rockets.velocity,
+                        rockets.thrust_percent, self._obs).copy()
+
+    def step(self, actions):
+        """Applies one action to every environment.
+
+        Args:
+            actions: The (K,) array of integer thrust levels.
+
+        Returns:
+            The (observations, rewards, dones, infos) tuple of arrays, except
+            for infos which is a dict of arrays.
+        """
+        rockets = self._rockets
+        rockets.set_thrust(np.asarray(actions) / (NUM_ACTIONS - 1))
+        rockets.update(self._dt)
+        self._steps += 1
+        rewards = _reward(rockets.position, rockets.velocity,
+                          rockets.thrust_percent)
+        dones = ((rockets.position[:, 1] < CEILING_Y) |
+                 (self._steps >= self._max_steps))
+        steps = self._steps.copy()
+        if dones.any():
+            rockets.reset(self._start, dones)
+            self._steps[dones] = 0
+        obs = _observe(rockets.position, rockets.velocity,
+                       rockets.thrust_percent, self._obs).copy()
+        return obs, rewards, dones, {'steps': steps}
+
+
+def _shared_array(shm, shape, dtype, offset):
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+    return array, offset + array.nbytes
+
+
+def _serve(connection, shm, num_envs, start, stop, dt, max_steps):
+    """Steps the [start, stop) shard of a SubprocVecEnv's environments."""
+    buffers = SubprocVecEnv._buffers(shm, num_envs)
+    obs, actions, rewards, dones = (b[start:stop] for b in buffers)
+    env = VecRocketEnv(stop - start, dt=dt, max_steps=max_steps)
+    while True:
+        command = connection.recv()
+        if command == 'step':
+            obs[:], rewards[:], dones[:], _ = env.step(actions)
+        elif command == 'reset':
+            obs[:] = env.reset()
+        elif command == 'close':
+            return
+        connection.send(None)
+
+
+def _worker(connection, shm_name, *args):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        _serve(connection, shm, *args)
+    finally:
+        shm.close()
+        connection.close()
+
+
+class SubprocVecEnv(object):
+    """K rocket hover environments sharded across worker processes.
+
+    Has the same interface as VecRocketEnv. Every worker steps its shard as a
+    VecRocketEnv and observations, actions, rewards and dones are exchanged
+    through a single shared memory block, so only tiny command messages go
+    through pipes. Must be closed (or used as a context manager).
+    """
+
+    def __init__(self, num_envs, num_workers=None, dt=sim.DT, max_steps=2400):
+        """Initializes a new SubprocVecEnv instance.
+
+        Args:
+            num_envs: The number of environments K.
+            num_workers: The number of worker processes. Defaults to the
+                number of cores, capped at num_envs.
+            dt: The simulated time per step.
+            max_steps: The number of steps after which an episode ends.
+        """
+        num_workers = min(num_workers or multiprocessing.cpu_count(), num_envs)
+        self._num_envs = num_envs
+        size = sum(np.dtype(dtype).itemsize * np.prod(shape)
+                   for shape, dtype in self._layout(num_envs))
+        self._shm = shared_memory.SharedMemory(create=True, size=int(size))
+        (self._obs, self._actions, self._rewards,
+         self._dones) = self._buffers(self._shm, num_envs)
+
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self._connections = []
+        self._processes = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                    target=_worker,
+                    args=(child, self._shm.name, num_envs, start, stop, dt,
+                          max_steps),
+                    daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    @staticmethod
+    def _layout(num_envs):
+        return (((num_envs, OBSERVATION_SIZE), np.float32),
+                ((num_envs,), np.int64),
+                ((num_envs,), np.float64),
+                ((num_envs,), np.bool_))
+
+    @staticmethod
+    def _buffers(shm, num_envs):
+        """Returns (obs, actions, rewards, dones) views into shared memory."""
+        buffers = []
+        offset = 0
+        for shape, dtype in SubprocVecEnv._layout(num_envs):
+            array, offset = _shared_array(shm, shape, dtype, offset)
+            buffers.append(array)
+        return buffers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def num_envs(self):
+        return self._num_envs
+
+    def _broadcast(self, command):
+        for connection in self._connections:
+            connection.send(command)
+        for connection in self._connections:
+            connection.recv()
+
+    def reset(self):
+        """See VecRocketEnv.reset."""
+        self._broadcast('reset')
+        return self._obs.copy()
+
+    def step(self, actions):
+        """See VecRocketEnv.step. Infos are not collected from workers."""
+        self._actions[:] = actions
+        self._broadcast('step')
+        return (self._obs.copy(), self._rewards.copy(), self._dones.copy(),
+                {})
+
+    def close(self):
+        if self._shm is None:
+            return
+        for connection in self._connections:
+            connection.send('close')
+            connection.close()
+        for process in self._processes:
+            process.join()
+        del self._obs, self._actions, self._rewards, self._dones
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
@@ -162,6 +162,8 @@ __version__ = "5.0"
 
 import time, os, sys
 
+import numpy as np
+
 try:  # import as appropriate for 2.x vs. 3.x
    import tkinter as tk
 except:
@@ -182,23 +184,104 @@ BAD_OPTION = "Illegal option value"
 ##########################################################################
 # global variables and funtions
 
-_root = tk.Tk()
-_root.withdraw()
-
-_update_lasttime = time.time()
+# The Tk root is created lazily by _get_root so that importing this module is
+# cheap and does not require a display.
+_root = None
+
+def _get_root():
+    global _root
+    if _root is None:
+        _root = tk.Tk()
+        _root.withdraw()
+        # MacOS fix 1
+        _root.update()
+    return _root
+
+class FramePacer:
+
+    """Paces a loop to a fixed rate with precise, drift-free deadlines.
+
+    Deadlines are laid out on a fixed grid of 1/rate seconds measured
+    with the monotonic time.perf_counter, so lateness in one frame does
+    not shift later ones. Waiting sleeps until shortly before the
+    deadline and then spins, since sleep alone may overshoot by
+    milliseconds; the spin margin grows to cover the worst oversleep
+    seen. The spin yields the GIL on every iteration so that other
+    threads, e.g. the simulator's physics thread, keep running. Frames
+    which overrun by whole periods are skipped rather than rushed to
+    catch up.
+    """
+
+    def __init__(self, rate, spin=0.002):
+        self.rate = rate
+        self.period = 1. / rate
+        self._spin = spin
+        self._deadline = None
+        self.frames = 0
+        self.missed = 0          # deadlines already passed when waiting
+        self.skipped = 0         # whole periods dropped to catch up
+        self.max_lateness = 0.   # worst wake-up error, in seconds
+        self._total_lateness = 0.
+
+    def wait(self):
+        """Blocks until the next deadline. The first call returns at once."""
+        now = time.perf_counter()
+        if self._deadline is None:
+            self._deadline = now + self.period
+            return
+        deadline = self._deadline
+        remaining = deadline - now
+        if remaining < 0:
+            self.missed += 1
+            skipped = int(-remaining // self.period)
+            self.skipped += skipped
+            # Re-align to the next deadline on the grid.
+            deadline += skipped * self.period
+            self._deadline = deadline + self.period
+            self.frames += 1
+            return
+        if remaining > self._spin:
+            wake = deadline - self._spin
+            time.sleep(remaining - self._spin)
+            oversleep = time.perf_counter() - wake
+            if oversleep > self._spin:
+                self._spin = min(oversleep * 1.25, self.period / 2)
+        now = time.perf_counter()
+        while now < deadline:
+            # Yield the GIL to other threads while spinning.
+            time.sleep(0)
+            now = time.perf_counter()
+        lateness = now - deadline
+        self.max_lateness = max(self.max_lateness, lateness)
+        self._total_lateness += lateness
+        self.frames += 1
+        self._deadline = deadline + self.period
+
+    def stats(self):
+        """Returns a dict of frame, missed deadline and lateness stats."""
+        waited = self.frames - self.missed
+        return {'frames': self.frames,
+                'missed': self.missed,
+                'skipped': self.skipped,
+                'mean_lateness_ms':
+                    1e3 * self._total_lateness / max(waited, 1),
+                'max_lateness_ms': 1e3 * self.max_lateness}
+
+_pacer = None
+
+def frame_pacer():
+    """Returns the FramePacer used by update, or None if not rate limited."""
+    return _pacer
 
 def update(rate=None):
-    global _update_lasttime
+    global _pacer
     if rate:
-        now = time.time()
-        pauseLength = 1/rate-(now-_update_lasttime)
-        if pauseLength > 0:
-            time.sleep(pauseLength)
-            _update_lasttime = now + pauseLength
-        else:
-            _update_lasttime = now
+        if _pacer is None or _pacer.rate != rate:
+            _pacer = FramePacer(rate)
+        _pacer.wait()
 
-    _root.update()
+    if _root is not None:
+        _root.update()
 
 ############################################################################
 # Graphics classes start here
@@ -210,7 +293,7 @@ class GraphWin(tk.Canvas):
     def __init__(self, title="Graphics Window",
                  width=200, height=200, autoflush=True):
         assert type(title) == type(""), "Title must be a string"
-        master = tk.Toplevel(_root)
+        master = tk.Toplevel(_get_root())
         master.protocol("WM_DELETE_WINDOW", self.close)
         tk.Canvas.__init__(self, master, width=width, height=height,
                            highlightthickness=0, bd=0)
@@ -218,7 +301,7 @@ class GraphWin(tk.Canvas):
         self.pack()
         master.resizable(0,0)
         self.foreground = "black"
-        self.items = []
+        self.items = {}  # Drawn GraphicsObjects keyed by their Tk id.
         self.mouseX = None
         self.mouseY = None
         self.bind("<Button-1>", self._onClick)
@@ -233,7 +316,7 @@ class GraphWin(tk.Canvas):
         master.attributes('-topmost',True)
         master.after_idle(master.attributes,'-topmost',False)
         self.lastKey = ""
-        if autoflush: _root.update()
+        if autoflush: _get_root().update()
 
     def __repr__(self):
         if self.isClosed():
@@ -285,7 +368,7 @@ class GraphWin(tk.Canvas):
 
     def __autoflush(self):
         if self.autoflush:
-            _root.update()
+            _get_root().update()
 
     
     def plot(self, x, y, color="black"):
@@ -378,6 +461,24 @@ class GraphWin(tk.Canvas):
             return self.trans.world(x,y)
         else:
             return x,y
+
+    def toScreenArray(self, points):
+        """Returns an (N, 2) array of world coordinates in screen
+        coordinates, converted with a single numpy operation."""
+        trans = self.trans
+        if trans:
+            return trans.screenArray(points)
+        else:
+            return np.asarray(points, dtype=float)
+
+    def toWorldArray(self, points):
+        """Returns an (N, 2) array of screen coordinates in world
+        coordinates."""
+        trans = self.trans
+        if trans:
+            return trans.worldArray(points)
+        else:
+            return np.asarray(points, dtype=float)
         
     def setMouseHandler(self, func):
         self._mouseCallback = func
@@ -389,13 +490,42 @@ class GraphWin(tk.Canvas):
             self._mouseCallback(Point(e.x, e.y))
 
     def addItem(self, item):
-        self.items.append(item)
+        self.items[item.id] = item
+
+    def addItems(self, items):
+        self.items.update((item.id, item) for item in items)
 
     def delItem(self, item):
-        self.items.remove(item)
+        del self.items[item.id]
+
+    def delItems(self, items):
+        for item in items:
+            del self.items[item.id]
+
+    def drawAll(self, objects):
+        """Draw all the objects, updating the window at most once"""
+        self.__checkOpen()
+        objects = list(objects)
+        for obj in objects:
+            obj._attach(self)
+        self.addItems(objects)
+        self.__autoflush()
+
+    def undrawAll(self, objects):
+        """Undraw all the objects drawn in this window with a single Tk
+        delete call. Objects which are not drawn here are skipped."""
+        drawn = [obj for obj in objects if obj.canvas is self]
+        if not drawn: return
+        if not self.closed:
+            self.delete(*[obj.id for obj in drawn])
+            self.delItems(drawn)
+        for obj in drawn:
+            obj._detach()
+        if not self.closed:
+            self.__autoflush()
 
     def redraw(self):
-        for item in self.items[:]:
+        for item in list(self.items.values()):
             item.undraw()
             item.draw(self)
         self.update()
@@ -428,6 +558,26 @@ class Transform:
         y = self.ybase - ys*self.yscale
         return x,y
 
+    def screenArray(self, points):
+        # Returns an (N, 2) array of points in screen coordinates,
+        # rounded exactly like screen
+        points = np.asarray(points, dtype=float)
+        screen = np.empty(points.shape)
+        screen[..., 0] = points[..., 0] - self.xbase
+        screen[..., 0] /= self.xscale
+        np.subtract(self.ybase, points[..., 1], out=screen[..., 1])
+        screen[..., 1] /= self.yscale
+        screen += 0.5
+        return screen.astype(int)
+
+    def worldArray(self, points):
+        # Returns an (N, 2) array of screen points in world coordinates
+        points = np.asarray(points, dtype=float)
+        world = np.empty(points.shape)
+        world[..., 0] = points[..., 0] * self.xscale + self.xbase
+        world[..., 1] = self.ybase - points[..., 1] * self.yscale
+        return world
+
 
 # Default values for various item configuration options. Only a subset of
 #   keys may be present in the configuration dictionary for a given item
@@ -454,6 +604,7 @@ class GraphicsObject:
         #    drawn shape.
         self.canvas = None
         self.id = None
+        self.hidden = False
 
         # config is the dictionary of configuration options for the widget.
         config = {}
@@ -480,14 +631,21 @@ class GraphicsObject:
         window. Raises an error if attempt made to draw an object that
         is already visible."""
 
+        self._attach(graphwin)
+        graphwin.addItem(self)
+        if graphwin.autoflush:
+            _get_root().update()
+        return self
+
+    def _attach(self, graphwin):
+        # Internal method which creates the Tk item for the object
+        # without registering it with or flushing the window.
         if self.canvas and not self.canvas.isClosed(): raise GraphicsError(OBJ_ALREADY_DRAWN)
         if graphwin.isClosed(): raise GraphicsError("Can't draw to closed window")
         self.canvas = graphwin
         self.id = self._draw(graphwin, self.config)
-        graphwin.addItem(self)
-        if graphwin.autoflush:
-            _root.update()
-        return self
+        if self.hidden:
+            graphwin.itemconfig(self.id, state="hidden")
 
             
     def undraw(self):
@@ -500,7 +658,12 @@ class GraphicsObject:
             self.canvas.delete(self.id)
             self.canvas.delItem(self)
             if self.canvas.autoflush:
-                _root.update()
+                _get_root().update()
+        self._detach()
+
+    def _detach(self):
+        # Internal method which forgets the window the object was drawn
+        # in once its Tk item has been deleted.
         self.canvas = None
         self.id = None
 
@@ -522,7 +685,42 @@ class GraphicsObject:
                 y = dy
             self.canvas.move(self.id, x, y)
             if canvas.autoflush:
-                _root.update()
+                _get_root().update()
+
+    def reshape(self, *coords):
+
+        """Move the points defining the object to the world coordinates
+        x1, y1, x2, y2, ... or to a single (N, 2) array of points. If
+        the object is drawn, its Tk item is updated in place instead of
+        being deleted and recreated."""
+
+        if len(coords) == 1:
+            coords = coords[0]
+        points = np.asarray(coords, dtype=float)
+        if points.size % 2:
+            raise GraphicsError(BAD_OPTION)
+        points = points.reshape(-1, 2)
+        self._reshape(points)
+        canvas = self.canvas
+        if canvas and not canvas.isClosed():
+            screen = canvas.toScreenArray(points).ravel().tolist()
+            canvas.coords(self.id, screen)
+            if canvas.autoflush:
+                _get_root().update()
+
+    def setVisible(self, visible):
+
+        """Show or hide the object without undrawing it. Cheaper than
+        undraw followed by draw since the Tk item is kept around."""
+
+        hidden = not visible
+        if hidden == self.hidden: return
+        self.hidden = hidden
+        canvas = self.canvas
+        if canvas and not canvas.isClosed():
+            canvas.itemconfig(self.id, state="hidden" if hidden else "normal")
+            if canvas.autoflush:
+                _get_root().update()
            
     def _reconfig(self, option, setting):
         # Internal method for changing configuration of the object
@@ -535,7 +733,7 @@ class GraphicsObject:
         if self.canvas and not self.canvas.isClosed():
             self.canvas.itemconfig(self.id, options)
             if self.canvas.autoflush:
-                _root.update()
+                _get_root().update()
 
 
     def _draw(self, canvas, options):
@@ -548,6 +746,11 @@ class GraphicsObject:
         """updates internal state of object to move it dx,dy units"""
         pass # must override in subclass
 
+    def _reshape(self, points):
+        """updates internal state of object to the (N, 2) array of
+        points"""
+        raise GraphicsError(UNSUPPORTED_METHOD)
+
          
 class Point(GraphicsObject):
     def __init__(self, x, y):
@@ -589,6 +792,11 @@ class _BBox(GraphicsObject):
         self.p1.y = self.p1.y + dy
         self.p2.x = self.p2.x + dx
         self.p2.y = self.p2.y  + dy
+
+    def _reshape(self, points):
+        if len(points) != 2:
+            raise GraphicsError(BAD_OPTION)
+        (self.p1.x, self.p1.y), (self.p2.x, self.p2.y) = points.tolist()
                 
     def getP1(self): return self.p1.clone()
 
@@ -690,38 +898,84 @@ class Line(_BBox):
         self._reconfig("arrow", option)
         
 
-class Polygon(GraphicsObject):
-    
-    def __init__(self, *points):
-        # if points passed as a list, extract it
-        if len(points) == 1 and type(points[0]) == type([]):
+class _Path(GraphicsObject):
+    # Internal base class for objects represented by a sequence of
+    # points, which are kept in an (N, 2) numpy array so they can be
+    # transformed and drawn without per-point Python calls.
+
+    def __init__(self, points, options):
+        GraphicsObject.__init__(self, options)
+        # if points passed as a list of Points, convert them
+        if len(points) == 1 and not isinstance(points[0], Point):
             points = points[0]
-        self.points = list(map(Point.clone, points))
-        GraphicsObject.__init__(self, ["outline", "width", "fill"])
+        if len(points) and isinstance(points[0], Point):
+            points = [(p.x, p.y) for p in points]
+        self.coords = np.array(points, dtype=float).reshape(-1, 2)
+
+    @property
+    def points(self):
+        return [Point(x, y) for x, y in self.coords.tolist()]
+
+    def getPoints(self):
+        return self.points
+
+    def _move(self, dx, dy):
+        self.coords += (dx, dy)
+
+    def _reshape(self, points):
+        if len(points) == len(self.coords):
+            self.coords[:] = points
+        else:
+            self.coords = points.copy()
+
+    def _screenCoords(self, canvas):
+        return canvas.toScreenArray(self.coords).ravel().tolist()
+
+
+class Polygon(_Path):
+
+    def __init__(self, *points):
+        # points may be Points, a list of Points or an (N, 2) array
+        _Path.__init__(self, points, ["outline", "width", "fill"])
 
     def __repr__(self):
         return "Polygon"+str(tuple(p for p in self.points))
         
     def clone(self):
-        other = Polygon(*self.points)
+        other = Polygon(self.coords)
         other.config = self.config.copy()
         return other
 
-    def getPoints(self):
-        return list(map(Point.clone, self.points))
+    def _draw(self, canvas, options):
+        return GraphWin.create_polygon(canvas, self._screenCoords(canvas),
+                                       options)
+
+
+class Polyline(_Path):
+
+    """An open line through a sequence of points."""
+
+    def __init__(self, *points):
+        # points may be Points, a list of Points or an (N, 2) array
+        _Path.__init__(self, points, ["arrow", "fill", "width"])
+        self.setFill(DEFAULT_CONFIG['outline'])
+        self.setOutline = self.setFill
+
+    def __repr__(self):
+        return "Polyline"+str(tuple(p for p in self.points))
+
+    def clone(self):
+        other = Polyline(self.coords)
+        other.config = self.config.copy()
+        return other
 
-    def _move(self, dx, dy):
-        for p in self.points:
-            p.move(dx,dy)
-   
     def _draw(self, canvas, options):
-        args = [canvas]
-        for p in self.points:
-            x,y = canvas.toScreen(p.x,p.y)
-            args.append(x)
-            args.append(y)
-        args.append(options)
-        return GraphWin.create_polygon(*args) 
+        return canvas.create_line(self._screenCoords(canvas), options)
+
+    def setArrow(self, option):
+        if not option in ["first","last","both","none"]:
+            raise GraphicsError(BAD_OPTION)
+        self._reconfig("arrow", option)
 
 class Text(GraphicsObject):
     
@@ -789,7 +1043,7 @@ class Entry(GraphicsObject):
         self.anchor = p.clone()
         #print self.anchor
         self.width = width
-        self.text = tk.StringVar(_root)
+        self.text = tk.StringVar(_get_root())
         self.text.set("")
         self.fill = "gray"
         self.color = "black"
@@ -873,6 +1127,9 @@ class Entry(GraphicsObject):
             self.entry.config(fg=color)
 
 
+# Characters stripped from Tk photo image data to leave only hex digits.
+_PIXEL_DATA_JUNK = str.maketrans("", "", "{}#")
+
 class Image(GraphicsObject):
 
     idCount = 0
@@ -884,10 +1141,11 @@ class Image(GraphicsObject):
         self.imageId = Image.idCount
         Image.idCount = Image.idCount + 1
         if len(pixmap) == 1: # file name provided
-            self.img = tk.PhotoImage(file=pixmap[0], master=_root)
+            self.img = tk.PhotoImage(file=pixmap[0], master=_get_root())
         else: # width and height provided
             width, height = pixmap
-            self.img = tk.PhotoImage(master=_root, width=width, height=height)
+            self.img = tk.PhotoImage(master=_get_root(), width=width,
+                                     height=height)
 
     def __repr__(self):
         return "Image({}, {}, {})".format(self.anchor, self.getWidth(), self.getHeight())
@@ -901,12 +1159,12 @@ class Image(GraphicsObject):
     def _move(self, dx, dy):
         self.anchor.move(dx,dy)
         
-    def undraw(self):
+    def _detach(self):
         try:
             del self.imageCache[self.imageId]  # allow gc of tk photoimage
         except KeyError:
             pass
-        GraphicsObject.undraw(self)
+        GraphicsObject._detach(self)
 
     def getAnchor(self):
         return self.anchor.clone()
@@ -945,7 +1203,38 @@ class Image(GraphicsObject):
         
         """
         self.img.put("{" + color +"}", (x, y))
-        
+
+    def getPixels(self):
+        """Returns all pixels as a numpy uint8 array of shape
+        (height, width, 3) with a single Tk call.
+
+        """
+        # Tk returns rows of "#rrggbb" colors, e.g. "{#ff0000 #00ff00} {...}".
+        data = self.img.tk.eval("{} data".format(self.img.name))
+        rgb = bytes.fromhex(data.translate(_PIXEL_DATA_JUNK))
+        return np.frombuffer(rgb, dtype=np.uint8).reshape(
+            self.getHeight(), self.getWidth(), 3)
+
+    def setPixels(self, pixels, x=0, y=0):
+        """Sets a block of pixels with its top left corner at (x,y)
+        from a numpy array of shape (height, width, 3) or, for gray
+        levels, (height, width) with values in range(256).
+
+        The pixels are sent to Tk as a single binary PPM image instead
+        of one call per pixel.
+
+        """
+        pixels = np.asarray(pixels)
+        if pixels.ndim == 2:
+            pixels = np.repeat(pixels[:, :, None], 3, axis=2)
+        height, width = pixels.shape[:2]
+        header = "P6 {} {} 255 ".format(width, height).encode()
+        data = header + np.ascontiguousarray(pixels, dtype=np.uint8).tobytes()
+        block = tk.PhotoImage(master=_get_root(), width=width,
+                              height=height, data=data, format="PPM")
+        self.img.tk.call(self.img.name, "copy", block.name,
+                         "-to", x, y)
+
 
     def save(self, filename):
         """Saves the pixmap image to filename.
@@ -1010,8 +1299,5 @@ def test():
 #MacOS fix 2
 #tk.Toplevel(_root).destroy()
 
-# MacOS fix 1
-update()
-
 if __name__ == "__main__":
     test()
@@ -0,0 +1,149 @@
+"""Numerical integrators for second order equations of motion.
+
+An integrator advances a position `x` and velocity `v` by a timestep `dt`
+given a function `acceleration(x, v)`. Positions and velocities may be
+scalars or NumPy arrays of any (matching) shape. New values are returned
+and the inputs are never modified.
+"""
+
+import abc
+
+import numpy as np
+
+
+class Integrator(object):
+    """Abstract Integrator class meant to be subclassed by all integrators."""
+
+    @abc.abstractmethod
+    def step(self, x, v, acceleration, dt):
+        """Advances the state by one timestep.
+
+        Must be overridden by the subclass.
+
+        Args:
+            x: The current position.
+            v: The current velocity.
+            acceleration: A function of (x, v) returning the acceleration.
+            dt: The timestep.
+
+        Returns:
+            The (x, v) tuple after dt has elapsed.
+        """
+
+
+class ExplicitEuler(Integrator):
+    """First order explicit (forward) Euler."""
+
+    def step(self, x, v, acceleration, dt):
+        a = acceleration(x, v)
+        return x + v * dt, v + a * dt
+
+
+class SymplecticEuler(Integrator):
+    """First order semi-implicit Euler.
+
+    The velocity is updated first and the new velocity is used to update the
+    position. Unlike explicit Euler, it conserves energy well over long runs.
+    """
+
+    def step(self, x, v, acceleration, dt):
+        v = v + acceleration(x, v) * dt
+        return x + v * dt, v
+
+
+class VelocityVerlet(Integrator):
+    """Second order velocity Verlet.
+
+    For velocity dependent accelerations, the velocity at the end of the step
+    is estimated with an Euler step.
+    """
+
+    def step(self, x, v, acceleration, dt):
+        a0 = acceleration(x, v)
+        x1 = x + v * dt + .5 * a0 * dt * dt
+        a1 = acceleration(x1, v + a0 * dt)
+        return x1, v + .5 * (a0 + a1) * dt
+
+
+class RK4(Integrator):
+    """Classic fourth order Runge-Kutta."""
+
+    def step(self, x, v, acceleration, dt):
+        k1x, k1v = v, acceleration(x, v)
+        x2, v2 = x + .5 * dt * k1x, v + .5 * dt * k1v
+        k2x, k2v = v2, acceleration(x2, v2)
+        x3, v3 = x + .5 * dt * k2x, v + .5 * dt * k2v
+        k3x, k3v = v3, acceleration(x3, v3)
+        x4, v4 = x + dt * k3x, v + dt * k3v
+        k4x, k4v = v4, acceleration(x4, v4)
+        return (x + dt / 6 * (k1x + 2 * k2x + 2 * k3x + k4x),
+                v + dt / 6 * (k1v + 2 * k2v + 2 * k3v + k4v))
+
+
+# Dormand-Prince 5(4) Butcher tableau.
+_DP_A = ((),
+         (1/5,),
+         (3/40, 9/40),
+         (44/45, -56/15, 32/9),
+         (19372/6561, -25360/2187, 64448/6561, -212/729),
+         (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+         (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84))
+_DP_B5 = (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0)
+_DP_B4 = (5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40)
+
+
+class RK45(Integrator):
+    """Adaptive Dormand-Prince 5(4) Runge-Kutta.
+
+    Each call to `step` covers exactly dt, taking as many internal substeps as
+    needed to keep the estimated local error within tolerance. The substep
+    size is remembered across calls so smooth motion quickly settles on a
+    single substep per step.
+    """
+
+    def __init__(self, tolerance=1e-6, min_step=1e-6, safety=.9):
+        """Initializes a new RK45 instance.
+
+        Args:
+            tolerance: The maximum allowed local error per substep.
+            min_step: The smallest allowed substep. Substeps this small are
+                accepted regardless of their error.
+            safety: The factor by which the optimal substep is shrunk.
+        """
+        self._tolerance = tolerance
+        self._min_step = min_step
+        self._safety = safety
+        self._h = None
+
+    def _substep(self, x, v, acceleration, h):
+        kx, kv = [], []
+        for a_row in _DP_A:
+            xi, vi = x, v
+            for a, dx, dv in zip(a_row, kx, kv):
+                xi = xi + h * a * dx
+                vi = vi + h * a * dv
+            kx.append(vi)
+            kv.append(acceleration(xi, vi))
+        x5, v5, x4, v4 = x, v, x, v
+        for b5, b4, dx, dv in zip(_DP_B5, _DP_B4, kx, kv):
+            x5, v5 = x5 + h * b5 * dx, v5 + h * b5 * dv
+            x4, v4 = x4 + h * b4 * dx, v4 + h * b4 * dv
+        error = max(np.max(np.abs(x5 - x4)), np.max(np.abs(v5 - v4)))
+        return x5, v5, error
+
+    def step(self, x, v, acceleration, dt):
+        remaining = dt
+        h = min(self._h or dt, dt)
+        while remaining > 0:
+            h = min(h, remaining)
+            x1, v1, error = self._substep(x, v, acceleration, h)
+            if error <= self._tolerance or h <= self._min_step:
+                x, v = x1, v1
+                remaining -= h
+                growth = 5. if error == 0 else min(
+                        5., self._safety * (self._tolerance / error) ** .2)
+                self._h = h = max(h * growth, self._min_step)
+            else:
+                shrink = max(.2, self._safety * (self._tolerance / error) ** .25)
+                h = max(h * shrink, self._min_step)
+        return x, v
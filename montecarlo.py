@@ -0,0 +1,246 @@
+"""Monte Carlo robustness sweeps for PID hover controllers.
+
+Every rollout samples its own rocket mass, max thrust, gravity, altitude
+sensor noise, actuation delay and initial conditions, then flies a PID
+controller with fixed gains. Rollouts are split into fixed-size shards which
+are simulated as vectorized batches on a process pool. Each shard gets its
+own seed spawned from a single root seed, so results do not depend on the
+number of workers. Shards only return streaming summary statistics, never
+trajectories, so memory use does not grow with the number of rollouts.
+"""
+
+import concurrent.futures
+
+import numpy as np
+
+import simulator as sim
+from controller import BatchPIDController
+from thrust import SigmoidThrust
+
+# The (low, high) range each parameter is sampled uniformly from.
+PARAMETER_RANGES = {
+        'mass': (.8 * 27670., 1.2 * 27670.),  # In kilograms.
+        'max_thrust_force': (.9 * 410000., 1.1 * 410000.),  # In newtons.
+        'gravity': (9.7, 9.9),
+        # Standard deviation in pixels. The derivative term amplifies
+        # per-tick noise, so even small amounts degrade the default gains.
+        'sensor_noise': (0., .05),
+        'actuation_delay': (0, 5),  # In ticks, inclusive.
+        'initial_y': (sim.GROUND_Y - 50., sim.GROUND_Y),
+        'initial_velocity': (-5., 5.),
+}
+
+# How close, in pixels, the rocket must stay to the target to be settled.
+SETTLING_BAND = 7.
+
+
+class RunningStats(object):
+    """Streaming count, mean, variance, extremes and histogram of values.
+
+    Statistics from different shards can be combined with `merge`.
+    """
+
+    def __init__(self, bins):
+        """Initializes a new, empty RunningStats instance.
+
+        Args:
+            bins: The histogram bin edges. Values outside the edges are
+                counted in the first or last bin.
+        """
+        self.bins = np.asarray(bins, dtype=np.float64)
+        self.histogram = np.zeros(len(self.bins) - 1, dtype=np.int64)
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0.
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def update(self, values):
+        """Adds an array of values."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        other = RunningStats(self.bins)
+        other.count = len(values)
+        other.mean = values.mean()
+        other._m2 = ((values - other.mean) ** 2).sum()
+        other.min = values.min()
+        other.max = values.max()
+        clipped = np.clip(values, self.bins[0], self.bins[-1])
+        other.histogram = np.histogram(clipped, self.bins)[0]
+        self.merge(other)
+
+    def merge(self, other):
+        """Adds the values summarized by another RunningStats instance."""
+        count = self.count + other.count
+        if not count:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+
+    def percentile(self, q):
+        """Approximates the q-th percentile from the histogram."""
+        if not self.count:
+            return np.nan
+        cdf = np.cumsum(self.histogram) / self.count
+        i = min(np.searchsorted(cdf, q / 100), len(self.histogram) - 1)
+        return self.bins[i + 1]
+
+
+class Summary(object):
+    """Aggregated results of a Monte Carlo sweep."""
+
+    def __init__(self, seconds):
+        self.rollouts = 0
+        self.successes = 0
+        # Settling times of the successful rollouts.
+        self.settling_time = RunningStats(np.linspace(0, seconds, 121))
+        # Final absolute altitude error of every rollout.
+        self.final_error = RunningStats(np.linspace(0, 50, 101))
+
+    @property
+    def success_rate(self):
+        return self.successes / self.rollouts if self.rollouts else 0.
+
+    def merge(self, other):
+        self.rollouts += other.rollouts
+        self.successes += other.successes
+        self.settling_time.merge(other.settling_time)
+        self.final_error.merge(other.final_error)
+
+    def __repr__(self):
+        return ('Summary(rollouts={}, success_rate={:.3f}, settling_time '
+                'mean={:.2f}s p50={:.2f}s p95={:.2f}s, final_error '
+                'mean={:.2f})'.format(
+                        self.rollouts, self.success_rate,
+                        self.settling_time.mean,
+                        self.settling_time.percentile(50),
+                        self.settling_time.percentile(95),
+                        self.final_error.mean))
+
+
+def sample_parameters(rng, num_rollouts, ranges=PARAMETER_RANGES):
+    """Samples a dict of (num_rollouts,) parameter arrays."""
+    params = {}
+    for name, (low, high) in ranges.items():
+        if name == 'actuation_delay':
+            params[name] = rng.integers(low, high, size=num_rollouts,
+                                        endpoint=True)
+        else:
+            params[name] = rng.uniform(low, high, size=num_rollouts)
+    return params
+
+
+def run_shard(seed, num_rollouts, gains, seconds, dt=sim.DT,
+              ranges=PARAMETER_RANGES):
+    """Simulates a shard of rollouts as one vectorized batch.
+
+    Args:
+        seed: The `np.random.SeedSequence` of the shard.
+        num_rollouts: The number of rollouts in the shard.
+        gains: The (kp, ki, kd) PID gains.
+        seconds: The amount of simulated time per rollout.
+        dt: The elapsed (simulated) time per tick.
+        ranges: The parameter ranges, see PARAMETER_RANGES.
+
+    Returns:
+        The shard's Summary.
+    """
+    rng = np.random.default_rng(seed)
+    params = sample_parameters(rng, num_rollouts, ranges)
+    kp, ki, kd = gains
+    controller = BatchPIDController(setpoint=sim.TARGET_Y, kp=kp, ki=ki,
+                                    kd=kd, size=num_rollouts)
+    mapping = SigmoidThrust()
+    pos = np.column_stack((np.full(num_rollouts, sim.WIDTH/2),
+                           params['initial_y']))
+    rockets = sim.RocketBatch(pos, mass=params['mass'],
+                              max_thrust_force=params['max_thrust_force'],
+                              gravity=params['gravity'])
+    rockets.velocity[:, 1] = params['initial_velocity']
+
+    # Thrust commands wait in a ring buffer until their delay has elapsed.
+    delay = params['actuation_delay']
+    history = np.zeros((int(delay.max()) + 1, num_rollouts))
+    columns = np.arange(num_rollouts)
+    noise_std = params['sensor_noise']
+    measured = np.empty(num_rollouts)
+    command = np.empty(num_rollouts)
+
+    num_ticks = int(np.ceil(seconds / dt))
+    last_unsettled = np.zeros(num_rollouts, dtype=np.int64)
+    escaped = np.zeros(num_rollouts, dtype=bool)
+    for tick in range(1, num_ticks + 1):
+        y = rockets.position[:, 1]
+        np.multiply(rng.standard_normal(num_rollouts), noise_std, out=measured)
+        measured += y
+        control_var = controller.tick(measured, dt)
+        mapping.percents(control_var, out=command)
+        history[tick % len(history)] = command
+        rockets.set_thrust(history[(tick - delay) % len(history), columns])
+        rockets.update(dt)
+
+        error = np.abs(sim.TARGET_Y - rockets.position[:, 1])
+        last_unsettled[error > SETTLING_BAND] = tick
+        escaped |= rockets.position[:, 1] < 0
+
+    success = ~escaped & (last_unsettled < num_ticks)
+    summary = Summary(seconds)
+    summary.rollouts = num_rollouts
+    summary.successes = int(success.sum())
+    summary.settling_time.update(last_unsettled[success] * dt)
+    summary.final_error.update(error)
+    return summary
+
+
+def monte_carlo(num_rollouts, gains=(1., .0001, 2.3), seconds=60.,
+                shard_size=1000, seed=0, max_workers=None,
+                ranges=PARAMETER_RANGES):
+    """Runs a Monte Carlo robustness sweep in parallel.
+
+    Args:
+        num_rollouts: The total number of rollouts.
+        gains: The (kp, ki, kd) PID gains.
+        seconds: The amount of simulated time per rollout.
+        shard_size: The number of rollouts simulated together by a worker.
+        seed: The root seed. The same seed and shard_size always produce the
+            same results, regardless of max_workers.
+        max_workers: The number of worker processes. Defaults to the number of
+            cores.
+        ranges: The parameter ranges, see PARAMETER_RANGES.
+
+    Returns:
+        The aggregated Summary.
+    """
+    sizes = [shard_size] * (num_rollouts // shard_size)
+    if num_rollouts % shard_size:
+        sizes.append(num_rollouts % shard_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    # Merge shards in submission order so floating point results are exactly
+    # reproducible.
+    summary = Summary(seconds)
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = [executor.submit(run_shard, shard_seed, size, gains,
+                                   seconds, sim.DT, ranges)
+                   for shard_seed, size in zip(seeds, sizes)]
+        for future in futures:
+            summary.merge(future.result())
+    return summary
+
+
+if __name__ == '__main__':
+    print(monte_carlo(10000))
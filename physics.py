@@ -1,17 +1,21 @@
 """A rigid body physics simulator."""
 
+import copy
 import time
 
-import graphics as g
 import numpy as np
 
+from integrators import SymplecticEuler
+
 GRAVITY = np.array((0, 9.8))
 
 class RigidBody(object):
     """An abstract rigid body.
     
     The rigid body does not assume any shape and is completley described by
-    it's centroid (which is also assumed to be the center of mass).
+    it's centroid (which is also assumed to be the center of mass). A
+    `collision` shape can optionally be attached so the body takes part in
+    collision detection. Bodies with infinite mass are static.
     """
 
     # TODO(eugenhotaj): figure out center_of_mass and moment_of_inertia
@@ -20,7 +24,9 @@ class RigidBody(object):
                  mass, 
                  moment_of_inertia, 
                  position=(0, 0), 
-                 rotation=0):
+                 rotation=0,
+                 integrator=None,
+                 shape=None):
         """Initializes a new RigidBody instance.
         
         Args:
@@ -28,6 +34,12 @@ class RigidBody(object):
             moment_of_inertia: The moment of inertia of the rigid body.
             position: The (x, y) centroid of the rigid body.
             rotation: The rotation of the rigid body.
+            integrator: The `integrators.Integrator` used to resolve the
+                linear motion. A copy of it resolves the angular motion, so
+                stateful integrators (e.g. `integrators.RK45`) keep separate
+                state for each. Defaults to semi-implicit Euler.
+            shape: The optional `collision.AABB` or `collision.OBB` shape of
+                the rigid body, centered on its centroid.
         """
         self._m = mass
         self._mi = moment_of_inertia
@@ -35,6 +47,9 @@ class RigidBody(object):
         self._v = np.array((0, 0), dtype=np.float64)
         self._r = rotation
         self._av = 0
+        self._integrator = integrator or SymplecticEuler()
+        self._angular_integrator = copy.deepcopy(self._integrator)
+        self._shape = shape
 
         # Reset every tick.
         self._f = np.array((0, 0), dtype=np.float64)
@@ -48,6 +63,51 @@ class RigidBody(object):
     def rotation(self):
         return self._r
 
+    @property
+    def velocity(self):
+        return self._v
+
+    @property
+    def angular_velocity(self):
+        return self._av
+
+    @property
+    def mass(self):
+        return self._m
+
+    @property
+    def moment_of_inertia(self):
+        return self._mi
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def is_static(self):
+        return np.isinf(self._m)
+
+    def translate(self, offset):
+        """Moves the rigid body without affecting its velocity."""
+        self._p = self._p + offset
+
+    def apply_impulse(self, impulse, contact_point=None):
+        """Applies an instantaneous impulse to the rigid body.
+
+        Uses the same conventions as `apply_force` but changes the velocity and
+        angular velocity immediately. Static bodies are unaffected.
+
+        Args:
+            impulse: The impulse vector to apply to the rigid body.
+            contact_point: See `apply_force`.
+        """
+        if self.is_static:
+            return
+        cp = self._p if contact_point is None else contact_point
+        arm = cp - self._p
+        self._v = self._v + impulse / self._m
+        self._av += (arm[0] * impulse[1] - arm[1] * impulse[0]) / self._mi
+
     def apply_force(self, force, contact_point=None):
         """Applies a contact force to the rigid body.
         
@@ -60,9 +120,10 @@ class RigidBody(object):
                 is provided, the centroid of the rigid body will be used
                 resulting in 0 torque.
         """
-        cp = contact_point or self._p
+        cp = self._p if contact_point is None else contact_point
+        arm = cp - self._p
         self._f += force
-        self._t += np.cross(self._p - cp, force)
+        self._t += arm[0] * force[1] - arm[1] * force[0]
 
     def update(self, dt):
         """Resolves forces acting on body and updates position,  rotation.
@@ -70,25 +131,159 @@ class RigidBody(object):
         Args:
             dt: The elapsed time since the last call to update.
         """
+        if self.is_static:
+            self._f.fill(0)
+            self._t = 0
+            return
+
         # Linear component.
-        a = GRAVITY
-        a += self._f / self._m
-        self._v += a * dt
-        self._p += self._v * dt
+        a = GRAVITY + self._f / self._m
+        self._p, self._v = self._integrator.step(
+                self._p, self._v, lambda p, v: a, dt)
 
         # Angular component.
         aa = self._t / self._mi
-        self._av += aa  * dt
-        self._r += self._av * dt
+        self._r, self._av = self._angular_integrator.step(
+                self._r, self._av, lambda r, av: aa, dt)
 
         # Clear forces.
-        self._f = np.array((0, 0), dtype=np.float64)
+        self._f.fill(0)
         self._t = 0
 
 
+class RigidBodyWorld(object):
+    """A collection of rigid bodies simulated together.
+
+    Behaves like a list of `RigidBody` instances but stores the state of all
+    bodies in contiguous arrays (struct-of-arrays). Forces are accumulated
+    with scatter-adds and every body is integrated in a single vectorized,
+    allocation free step using semi-implicit Euler.
+    """
+
+    def __init__(self, capacity=64):
+        """Initializes a new, empty RigidBodyWorld instance.
+
+        Args:
+            capacity: The initial number of bodies to allocate space for. The
+                world grows automatically when more bodies are added.
+        """
+        self._n = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """(Re)allocates the state arrays, keeping existing bodies."""
+        def grow(old, shape):
+            new = np.zeros(shape, dtype=np.float64)
+            if old is not None:
+                new[:self._n] = old[:self._n]
+            return new
+
+        old = self.__dict__
+        self._m = grow(old.get('_m'), (capacity,))
+        self._mi = grow(old.get('_mi'), (capacity,))
+        self._p = grow(old.get('_p'), (capacity, 2))
+        self._v = grow(old.get('_v'), (capacity, 2))
+        self._r = grow(old.get('_r'), (capacity,))
+        self._av = grow(old.get('_av'), (capacity,))
+
+        # Reset every tick.
+        self._f = grow(old.get('_f'), (capacity, 2))
+        self._t = grow(old.get('_t'), (capacity,))
+
+        # Scratch space reused every tick to avoid allocations.
+        self._a = np.empty((capacity, 2))
+        self._aa = np.empty(capacity)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def positions(self):
+        return self._p[:self._n]
+
+    @property
+    def velocities(self):
+        return self._v[:self._n]
+
+    @property
+    def rotations(self):
+        return self._r[:self._n]
+
+    @property
+    def angular_velocities(self):
+        return self._av[:self._n]
+
+    def add_body(self, mass, moment_of_inertia, position=(0, 0), rotation=0):
+        """Adds a new body to the world.
+
+        Args:
+            mass: The mass of the rigid body.
+            moment_of_inertia: The moment of inertia of the rigid body.
+            position: The (x, y) centroid of the rigid body.
+            rotation: The rotation of the rigid body.
+
+        Returns:
+            The index of the new body.
+        """
+        if self._n == len(self._m):
+            self._allocate(2 * len(self._m))
+        i = self._n
+        self._m[i] = mass
+        self._mi[i] = moment_of_inertia
+        self._p[i] = position
+        self._r[i] = rotation
+        self._n += 1
+        return i
+
+    def apply_force(self, body, force, contact_point=None):
+        """Applies contact forces to bodies in the world.
+
+        Forces applied to the same body (even within the same call) add up.
+
+        Args:
+            body: The index, or (K,) array of indices, of the bodies.
+            force: The force vector(s) to apply, of shape (2,) or (K, 2).
+            contact_point: The contact point(s) in world coordinates, of shape
+                (2,) or (K, 2). See `RigidBody.apply_force`. If not provided,
+                the forces are applied at the centroids resulting in 0 torque.
+        """
+        force = np.asarray(force, dtype=np.float64)
+        np.add.at(self._f, body, force)
+        if contact_point is not None:
+            arm = contact_point - self._p[body]
+            torque = arm[..., 0] * force[..., 1] - arm[..., 1] * force[..., 0]
+            np.add.at(self._t, body, torque)
+
+    def update(self, dt):
+        """Resolves forces acting on all bodies and updates their state.
+
+        Args:
+            dt: The elapsed time since the last call to update.
+        """
+        n = self._n
+
+        # Linear component.
+        a = np.divide(self._f[:n], self._m[:n, None], out=self._a[:n])
+        a += GRAVITY
+        a *= dt
+        self._v[:n] += a
+        self._p[:n] += np.multiply(self._v[:n], dt, out=a)
+
+        # Angular component.
+        aa = np.divide(self._t[:n], self._mi[:n], out=self._aa[:n])
+        aa *= dt
+        self._av[:n] += aa
+        self._r[:n] += np.multiply(self._av[:n], dt, out=aa)
+
+        # Clear forces.
+        self._f[:n] = 0
+        self._t[:n] = 0
+
+
 class Simulation(object):
 
     def __init__(self):
+        import graphics as g  # Only the demo needs Tk.
         self._window = g.GraphWin('test', 400, 400, autoflush=False)       
         self._body = RigidBody(
                 mass=100, 
@@ -97,6 +292,7 @@ class Simulation(object):
                 rotation=np.pi/4)
 
     def _draw_body(self):
+        import graphics as g
         x, y = self._body.position
         w, h = 5, 5
         r = self._body.rotation
@@ -121,6 +317,7 @@ class Simulation(object):
 
     def run(self):
         """Runs the simulation until the user closes out."""
+        import graphics as g
         drawables = []
         t0 = time.time()
         while self._window.isOpen():
@@ -0,0 +1,164 @@
+"""Per-frame timing instrumentation for the simulation loop.
+
+A FrameProfiler splits every frame into named phases (e.g. physics,
+rendering and presenting the frame) and times each of them with
+`time.perf_counter_ns`. Durations of the most recent frames are kept in
+rolling windows from which percentiles, dropped frames and the split between
+work and waiting are computed. Callbacks can be hooked in before and after
+every phase.
+"""
+
+import collections
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Phases which are spent waiting rather than doing useful work.
+WAIT_PHASES = ('present', 'sleep')
+
+
+class RollingWindow(object):
+    """A fixed-size ring buffer of the most recent durations in nanoseconds."""
+
+    def __init__(self, size):
+        self._values = np.zeros(size, dtype=np.int64)
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, len(self._values))
+
+    def add(self, value):
+        self._values[self._count % len(self._values)] = value
+        self._count += 1
+
+    def values(self):
+        return self._values[:len(self)]
+
+    def percentile(self, q):
+        """Returns the q-th percentile of the window, or 0 if it is empty."""
+        return float(np.percentile(self.values(), q)) if len(self) else 0.
+
+    def mean(self):
+        return float(self.values().mean()) if len(self) else 0.
+
+
+class FrameProfiler(object):
+    """Times the phases of every frame.
+
+    Usage:
+        profiler.begin('physics')
+        ...
+        profiler.end('physics')
+        ...
+        profiler.end_frame()
+    """
+
+    def __init__(self, fps, window_size=600, log_every=None):
+        """Initializes a new FrameProfiler instance.
+
+        Args:
+            fps: The target frame rate. Frames which take longer than 1.5
+                frame budgets are counted as dropped.
+            window_size: The number of most recent frames kept for statistics.
+            log_every: If provided, a summary is logged every log_every frames.
+        """
+        self._budget_ns = int(1e9 / fps)
+        self._window_size = window_size
+        self._log_every = log_every
+        self._frames = RollingWindow(window_size)
+        self._phases = collections.OrderedDict()
+        self._hooks = collections.defaultdict(list)
+        self._starts = {}
+        self._frame_start = None
+        self._frame_count = 0
+        self._dropped = 0
+
+    @property
+    def frame_count(self):
+        return self._frame_count
+
+    @property
+    def dropped_frames(self):
+        return self._dropped
+
+    def add_hook(self, when, phase, hook):
+        """Registers a callback to run around a phase.
+
+        Args:
+            when: Either 'before' or 'after'.
+            phase: The name of the phase.
+            hook: A function called with (phase, profiler). Time spent in
+                hooks is not attributed to the phase.
+        """
+        if when not in ('before', 'after'):
+            raise ValueError('when must be "before" or "after".')
+        self._hooks[when, phase].append(hook)
+
+    def begin(self, phase):
+        """Marks the start of a phase."""
+        for hook in self._hooks.get(('before', phase), ()):
+            hook(phase, self)
+        now = time.perf_counter_ns()
+        if self._frame_start is None:
+            self._frame_start = now
+        self._starts[phase] = now
+
+    def end(self, phase):
+        """Marks the end of a phase and records its duration."""
+        duration = time.perf_counter_ns() - self._starts.pop(phase)
+        window = self._phases.get(phase)
+        if window is None:
+            window = self._phases[phase] = RollingWindow(self._window_size)
+        window.add(duration)
+        for hook in self._hooks.get(('after', phase), ()):
+            hook(phase, self)
+
+    def end_frame(self):
+        """Marks the end of a frame. The next begin starts a new frame."""
+        now = time.perf_counter_ns()
+        if self._frame_start is not None:
+            duration = now - self._frame_start
+            self._frames.add(duration)
+            if duration > 1.5 * self._budget_ns:
+                self._dropped += 1
+        self._frame_start = now
+        self._frame_count += 1
+        if self._log_every and self._frame_count % self._log_every == 0:
+            logger.info(self.summary())
+
+    def stats(self):
+        """Returns a dict of statistics over the recent frames.
+
+        Durations are in milliseconds. `work_fraction` is the fraction of
+        frame time not spent in WAIT_PHASES.
+        """
+        ms = 1e-6
+        stats = {'frames': self._frame_count,
+                 'dropped_frames': self._dropped,
+                 'frame_p50_ms': self._frames.percentile(50) * ms,
+                 'frame_p99_ms': self._frames.percentile(99) * ms}
+        wait = 0.
+        for phase, window in self._phases.items():
+            stats[phase + '_mean_ms'] = window.mean() * ms
+            stats[phase + '_p99_ms'] = window.percentile(99) * ms
+            if phase in WAIT_PHASES:
+                wait += window.mean()
+        frame_mean = self._frames.mean()
+        stats['work_fraction'] = (1 - wait / frame_mean) if frame_mean else 0.
+        return stats
+
+    def summary(self):
+        """Returns a short human readable summary of `stats`."""
+        stats = self.stats()
+        lines = ['frame p50 {:.2f}ms p99 {:.2f}ms, dropped {}'.format(
+                stats['frame_p50_ms'], stats['frame_p99_ms'],
+                stats['dropped_frames'])]
+        for phase in self._phases:
+            lines.append('{} mean {:.2f}ms p99 {:.2f}ms'.format(
+                    phase, stats[phase + '_mean_ms'],
+                    stats[phase + '_p99_ms']))
+        lines.append('work {:.0%}'.format(stats['work_fraction']))
+        return '\n'.join(lines)
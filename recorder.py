@@ -0,0 +1,163 @@
+"""Records rocket trajectories into compact columnar storage.
+
+Every recorded row holds the state of one rocket at one tick. Rows are
+buffered in preallocated NumPy arrays, one per column. In memory the buffers
+grow as needed. When a directory is given, the buffers are instead flushed in
+fixed-size chunks to one `.npy` file per column, so recording uses constant
+memory no matter how long the run is. The files can be memory-mapped for
+analysis with `load`.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+# The name, dtype and per-row shape of each recorded column.
+COLUMNS = (('t', np.float64, ()),
+           ('rocket', np.int32, ()),
+           ('position', np.float64, (2,)),
+           ('velocity', np.float64, (2,)),
+           ('thrust_percent', np.float64, ()),
+           ('control_var', np.float64, ()))
+
+# The .npy header is padded to a fixed size so that it can be rewritten in
+# place with the new number of rows after every flush.
+_HEADER_SIZE = 128
+_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def _write_header(f, dtype, shape):
+    """Writes a fixed size version 1.0 .npy header at the start of `f`."""
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': {!r}, }}".format(
+            np.lib.format.dtype_to_descr(np.dtype(dtype)), shape)
+    header_len = _HEADER_SIZE - len(_MAGIC) - 2
+    header = header.ljust(header_len - 1) + '\n'
+    assert len(header) == header_len, 'Header does not fit.'
+    f.seek(0)
+    f.write(_MAGIC + struct.pack('<H', header_len) + header.encode('latin1'))
+
+
+def load(directory, mmap=True):
+    """Loads recorded columns from disk.
+
+    Args:
+        directory: The directory passed to the TrajectoryRecorder.
+        mmap: If True, the columns are memory-mapped read-only instead of
+            being read into memory.
+
+    Returns:
+        A dict mapping column names to arrays.
+    """
+    mmap_mode = 'r' if mmap else None
+    return {name: np.load(os.path.join(directory, name + '.npy'),
+                          mmap_mode=mmap_mode)
+            for name, _, _ in COLUMNS}
+
+
+class TrajectoryRecorder(object):
+    """Records the per-tick state of one or more rockets."""
+
+    def __init__(self, directory=None, chunk_size=65536):
+        """Initializes a new TrajectoryRecorder instance.
+
+        Args:
+            directory: An optional directory to stream the recording to. It is
+                created if it does not exist and existing recordings in it are
+                overwritten. If not provided, the recording is kept in memory.
+            chunk_size: The number of rows buffered in memory before being
+                flushed to disk. The initial buffer size when recording in
+                memory.
+        """
+        self._directory = directory
+        self._size = 0  # Rows currently buffered.
+        self._flushed = 0  # Rows already written to disk.
+        self._buffers = {name: np.empty((chunk_size,) + shape, dtype=dtype)
+                         for name, dtype, shape in COLUMNS}
+        self._files = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._files = {}
+            for name, dtype, shape in COLUMNS:
+                f = open(os.path.join(directory, name + '.npy'), 'wb')
+                _write_header(f, dtype, (0,) + shape)
+                self._files[name] = f
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._flushed + self._size
+
+    def _reserve(self, n):
+        """Makes room for n more rows in the buffers."""
+        capacity = len(self._buffers['t'])
+        if self._size + n <= capacity:
+            return
+        if self._files is not None:
+            self.flush()
+            if n <= capacity:
+                return
+        capacity = max(2 * capacity, self._size + n)
+        for name, buffer in self._buffers.items():
+            grown = np.empty((capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+            grown[:self._size] = buffer[:self._size]
+            self._buffers[name] = grown
+
+    def record(self, t, rocket):
+        """Records the current state of the rocket(s).
+
+        Args:
+            t: The current simulated time.
+            rocket: A `simulator.Rocket` or `simulator.RocketBatch`. A batch of
+                N rockets is recorded as N rows, one per rocket.
+        """
+        position = np.reshape(rocket.position, (-1, 2))
+        n = len(position)
+        self._reserve(n)
+        rows = slice(self._size, self._size + n)
+        buffers = self._buffers
+        buffers['t'][rows] = t
+        buffers['rocket'][rows] = np.arange(n)
+        buffers['position'][rows] = position
+        buffers['velocity'][rows] = np.reshape(rocket.velocity, (-1, 2))
+        buffers['thrust_percent'][rows] = rocket.thrust_percent
+        buffers['control_var'][rows] = rocket.control_var
+        self._size += n
+
+    def flush(self):
+        """Writes the buffered rows to disk. Does nothing in memory."""
+        if self._files is None or not self._size:
+            return
+        self._flushed += self._size
+        for name, dtype, shape in COLUMNS:
+            f = self._files[name]
+            f.seek(0, os.SEEK_END)
+            f.write(self._buffers[name][:self._size].tobytes())
+            _write_header(f, dtype, (self._flushed,) + shape)
+            f.flush()
+        self._size = 0
+
+    def close(self):
+        """Flushes any buffered rows and closes the files on disk."""
+        if self._files is None:
+            return
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files = None
+
+    def columns(self):
+        """Returns a dict mapping column names to the recorded arrays.
+
+        In memory, the arrays are views into the recorder's buffers. On disk,
+        the recorder is flushed and the files are memory-mapped.
+        """
+        if self._directory is None:
+            return {name: buffer[:self._size]
+                    for name, buffer in self._buffers.items()}
+        self.flush()
+        return load(self._directory)
@@ -0,0 +1,294 @@
+"""Offline rendering of recorded rocket trajectories.
+
+Frames are rasterized straight into NumPy RGB buffers, without Tk, to look
+like the live `simulator.Simulation` window. They can then be encoded to an
+animated GIF or a PNG sequence. Encoding runs in parallel with rasterizing
+the following frames: PNGs on a thread pool, since zlib releases the GIL,
+and GIFs on a process pool, since their LZW encoder is pure Python. Only a
+bounded number of frames are in flight at a time, so memory use does not
+grow with the length of the recording.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import os
+import struct
+import zlib
+
+import numpy as np
+
+import simulator as sim
+
+# Match the defaults of simulator.Rocket.
+ROCKET_HEIGHT = 21.2
+ROCKET_DIAMETER = 1.7
+EXHAUST_MAX_HEIGHT = 12.5
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+ORANGE = (255, 165, 0)
+PALETTE = (WHITE, BLACK, RED, ORANGE)
+
+
+def _draw_line(frame, x0, y0, x1, y1, color):
+    """Rasterizes a one pixel wide line segment into the frame in place."""
+    num = int(max(abs(x1 - x0), abs(y1 - y0))) + 1
+    xs = np.rint(np.linspace(x0, x1, num)).astype(np.intp)
+    ys = np.rint(np.linspace(y0, y1, num)).astype(np.intp)
+    height, width, _ = frame.shape
+    visible = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    frame[ys[visible], xs[visible]] = color
+
+
+class Renderer(object):
+    """Rasterizes rocket frames into (HEIGHT, WIDTH, 3) uint8 RGB arrays."""
+
+    def __init__(self, width=sim.WIDTH, height=sim.HEIGHT):
+        self._background = np.full((height, width, 3), 255, dtype=np.uint8)
+        _draw_line(self._background, 0, sim.GROUND_Y, width, sim.GROUND_Y,
+                   BLACK)
+        _draw_line(self._background, width/2 - 50, sim.TARGET_Y,
+                   width/2 + 50, sim.TARGET_Y, RED)
+
+    def render(self, positions, thrust_percents):
+        """Renders a single frame.
+
+        Args:
+            positions: The (N, 2) array of rocket positions.
+            thrust_percents: The (N,) array of rocket thrust percents.
+
+        Returns:
+            The rendered frame.
+        """
+        frame = self._background.copy()
+        radius = (ROCKET_DIAMETER * sim.SCALE) / 2
+        height = ROCKET_HEIGHT * sim.SCALE
+        for (x, y), thrust_percent in zip(np.reshape(positions, (-1, 2)),
+                                          np.ravel(thrust_percents)):
+            _draw_line(frame, x - radius, y, x + radius, y, BLACK)
+            _draw_line(frame, x + radius, y, x, y - height, BLACK)
+            _draw_line(frame, x, y - height, x - radius, y, BLACK)
+            exhaust_height = EXHAUST_MAX_HEIGHT * thrust_percent * sim.SCALE
+            if exhaust_height:
+                _draw_line(frame, x, y, x, y + exhaust_height, ORANGE)
+        return frame
+
+    def render_columns(self, columns, fps=sim.FPS):
+        """Renders the frames of a recorded trajectory.
+
+        Args:
+            columns: The recorded columns, see `recorder.TrajectoryRecorder`.
+                Every tick must contain a row for every rocket.
+            fps: The frame rate at which the frames will be played back. One
+                frame is rendered for every 1 / fps seconds of real time.
+
+        Yields:
+            The rendered frames.
+        """
+        num_rockets = int(columns['rocket'].max()) + 1
+        t = columns['t'][::num_rockets]
+        positions = columns['position'].reshape(-1, num_rockets, 2)
+        thrust_percents = columns['thrust_percent'].reshape(-1, num_rockets)
+        frame_times = np.arange(t[0], t[-1], sim.SCALE / fps)
+        for i in np.searchsorted(t, frame_times):
+            yield self.render(positions[i], thrust_percents[i])
+
+
+def _bounded_map(executor, calls, max_pending):
+    """Submits calls to the executor and yields their results in order.
+
+    At most max_pending calls are in flight at a time, so `calls` is only
+    consumed as fast as results are drained.
+
+    Args:
+        executor: The `concurrent.futures.Executor` to submit to.
+        calls: An iterable of (function, *args) tuples.
+        max_pending: The maximum number of submitted but undrained calls.
+    """
+    pending = collections.deque()
+    for call in calls:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(*call))
+    while pending:
+        yield pending.popleft().result()
+
+
+def _max_pending(max_workers):
+    return 2 * (max_workers or os.cpu_count() or 1)
+
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return (struct.pack('>I', len(data)) + chunk +
+            struct.pack('>I', zlib.crc32(chunk) & 0xffffffff))
+
+
+def encode_png(frame):
+    """Encodes an RGB frame as PNG bytes."""
+    height, width, _ = frame.shape
+    # Prefix every row with filter type 0 (None).
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = frame.reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' +
+            _png_chunk(b'IHDR', header) +
+            _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) +
+            _png_chunk(b'IEND', b''))
+
+
+def save_png_sequence(frames, directory, max_workers=None):
+    """Saves frames as numbered PNG files, encoding them in parallel.
+
+    Returns:
+        The number of frames saved.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    def save(i, frame):
+        path = os.path.join(directory, 'frame_{:06d}.png'.format(i))
+        with open(path, 'wb') as f:
+            f.write(encode_png(frame))
+
+    num_frames = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        calls = ((save, i, frame) for i, frame in enumerate(frames))
+        for _ in _bounded_map(executor, calls, _max_pending(max_workers)):
+            num_frames += 1
+    return num_frames
+
+
+def _lzw_encode(indices, min_code_size):
+    """Compresses palette indices with GIF flavored variable width LZW."""
+    clear = 1 << min_code_size
+    end = clear + 1
+    out = bytearray()
+    bits = 0
+    num_bits = 0
+
+    table = {}
+    next_code = end + 1
+    code_size = min_code_size + 1
+    bits |= clear << num_bits
+    num_bits += code_size
+
+    prefix = indices[0]
+    for k in indices[1:]:
+        key = (prefix, k)
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        bits |= prefix << num_bits
+        num_bits += code_size
+        while num_bits >= 8:
+            out.append(bits & 0xff)
+            bits >>= 8
+            num_bits -= 8
+        if next_code < 4096:
+            table[key] = next_code
+            next_code += 1
+            if next_code > (1 << code_size) and code_size < 12:
+                code_size += 1
+        else:
+            # The table is full, start over.
+            bits |= clear << num_bits
+            num_bits += code_size
+            table = {}
+            next_code = end + 1
+            code_size = min_code_size + 1
+        prefix = k
+
+    for code in (prefix, end):
+        bits |= code << num_bits
+        num_bits += code_size
+    while num_bits > 0:
+        out.append(bits & 0xff)
+        bits >>= 8
+        num_bits -= 8
+    return bytes(out)
+
+
+def _gif_sub_blocks(data):
+    blocks = [bytes((len(data[i:i + 255]),)) + data[i:i + 255]
+              for i in range(0, len(data), 255)]
+    return b''.join(blocks) + b'\x00'
+
+
+def _gif_frame(indices, previous, delay):
+    """Encodes a frame as a GIF image block.
+
+    Only the bounding box of the pixels which changed since the previous frame
+    is encoded, the rest is left in place from the previous frame.
+    """
+    if previous is None:
+        top, left, bottom, right = 0, 0, indices.shape[0], indices.shape[1]
+    else:
+        changed = indices != previous
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        if len(rows):
+            top, bottom = rows[0], rows[-1] + 1
+            left, right = cols[0], cols[-1] + 1
+        else:
+            top, left, bottom, right = 0, 0, 1, 1
+    patch = indices[top:bottom, left:right]
+    min_code_size = 2
+    # Graphic control extension: disposal method 1 (leave in place).
+    control = b'\x21\xf9\x04\x04' + struct.pack('<H', delay) + b'\x00\x00'
+    descriptor = b'\x2c' + struct.pack('<HHHHB', left, top, patch.shape[1],
+                                       patch.shape[0], 0)
+    data = _lzw_encode(patch.ravel().tolist(), min_code_size)
+    return (control + descriptor + bytes((min_code_size,)) +
+            _gif_sub_blocks(data))
+
+
+def _to_indices(frame):
+    """Maps an RGB frame to indices into PALETTE."""
+    packed = ((frame[..., 0].astype(np.int32) << 16) |
+              (frame[..., 1].astype(np.int32) << 8) |
+              frame[..., 2])
+    palette = np.array([(r << 16) | (g << 8) | b for r, g, b in PALETTE])
+    order = np.argsort(palette)
+    indices = order[np.searchsorted(palette[order], packed)]
+    return indices.astype(np.uint8)
+
+
+def save_gif(frames, path, fps=sim.FPS, max_workers=None):
+    """Saves frames as a looping animated GIF, encoding them in parallel.
+
+    Frames may only use the colors in PALETTE.
+
+    Returns:
+        The number of frames saved.
+    """
+    frames = iter(frames)
+    first = _to_indices(next(frames))
+    height, width = first.shape
+    delay = int(round(100 / fps))
+    # Pad the palette to the 4 entries implied by the global color table size.
+    palette = b''.join(bytes(color) for color in PALETTE)
+    palette = palette.ljust(3 * 4, b'\x00')
+
+    def calls():
+        previous = None
+        for indices in itertools.chain((first,), map(_to_indices, frames)):
+            yield _gif_frame, indices, previous, delay
+            previous = indices
+
+    num_frames = 0
+    with open(path, 'wb') as f, \
+            concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        f.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0x81, 0, 0))
+        f.write(palette)
+        # Netscape application extension, loop forever.
+        f.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+        for block in _bounded_map(executor, calls(),
+                                  _max_pending(max_workers)):
+            f.write(block)
+            num_frames += 1
+        f.write(b'\x3b')
+    return num_frames
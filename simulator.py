@@ -4,19 +4,21 @@ We make a few simplifying assumptions about the rocket:
     * The rocket is treated as point with only thrust and gravity acting on it.
     * The rocket is perfectly stable with no horizontal forces acting on it.
     * The rocket is indestructable.
-    * The rocket has infinite fuel and therefore its mass does not change as 
-      it burns fuel.
+    * Unless given a finite amount of fuel, the rocket has infinite fuel and
+      therefore its mass does not change as it burns fuel. Otherwise fuel is
+      burned at the rate required by the thrust and the rocket's specific
+      impulse, and the engine cuts off once the fuel runs out.
     * The rocket is able to apply any percentage of thrust instantaneously and
       with perfect precision.
 """
 
+import threading
 import time 
-import graphics as g
 import numpy as np
-import tkinter as tk
 
 from controller import OnOffController
 from controller import PIDController
+from thrust import SigmoidThrust
 
 TITLE = 'Rockets'
 WIDTH = 800 
@@ -24,22 +26,41 @@ HEIGHT = 600
 
 FPS = 60
 SCALE = 2  # Pixels per meter.
+PHYSICS_HZ = 240  # Physics ticks per second of real time.
+MAX_STEPS_PER_FRAME = 8  # Physics ticks a single frame may catch up on.
 
 GRAVITY = np.array((0, 9.8))  # In m/s^2.
+STANDARD_GRAVITY = 9.80665  # In m/s^2, used to convert specific impulse.
 GROUND_Y = 550  # In pixels.
 TARGET_Y = 200  # In pixels.
 
+# Trails keep at most TRAIL_CAPACITY points, at least TRAIL_SPACING pixels
+# apart.
+TRAIL_CAPACITY = 2048
+TRAIL_SPACING = 2.
+
+# The simulated time which elapses during one physics tick. The simulation runs
+# SCALE times faster than real time.
+DT = SCALE / PHYSICS_HZ
+
 
 class Rocket(object):
     """A rocket equipped with a bottom thruster."""
 
+    # The (x, y, vx, vy, thrust_percent, control_var, mass, fuel_mass) state.
+    STATE_SIZE = 8
+
     def __init__(self, 
                  pos, 
                  height=21.2,
                  diameter=1.7,
                  mass=27670., 
                  max_thrust_force=410000.,
-                 controller=None):
+                 controller=None,
+                 integrator=None,
+                 thrust_mapping=None,
+                 fuel_mass=None,
+                 specific_impulse=255.):
         """Initializes a new Rocket instance.
 
         The default arguments correspond to the SpaceX Falcon 1 rocket.
@@ -52,16 +73,37 @@ class Rocket(object):
                 and not the simulation.
             diameter: The diameter of the rocket. Only affects the rocket's 
                 look and not the simulation.
-            mass: The mass of the rocket in kilograms.
+            mass: The initial mass of the rocket in kilograms, including any
+                fuel.
             max_thrust_force: The maximum thrust force at full burn in newtons.
             controller: The `controller.Controller` to use to drive the rocket.
+            integrator: The `integrators.Integrator` used to resolve the
+                rocket's motion. Defaults to an in place semi-implicit Euler
+                step, equivalent to `integrators.SymplecticEuler`.
+            thrust_mapping: The `thrust.ThrustMapping` which converts the
+                controller's signal to a thrust level. Defaults to
+                `thrust.SigmoidThrust`.
+            fuel_mass: The mass of the fuel in kilograms, at most mass. If
+                None or `np.inf`, the rocket has infinite fuel and a constant
+                mass.
+            specific_impulse: The engine's specific impulse in seconds. Only
+                used when fuel_mass is provided.
         """
         self._pos = np.array(pos, dtype=np.float32)
         self._vel = np.array((0., 0.))
+        if fuel_mass is not None and np.isinf(fuel_mass):
+            fuel_mass = None  # Infinite fuel, as in `set_state`.
+        if fuel_mass is not None and not 0 <= fuel_mass <= mass:
+            raise ValueError('fuel_mass must be in [0, mass].')
         self._mass = mass 
+        self._fuel_mass = fuel_mass
+        self._exhaust_velocity = specific_impulse * STANDARD_GRAVITY
         self._thrust_max_force = np.array((0., -max_thrust_force))
         self._thrust_percent = 0
         self._controller = controller
+        self._control_var = 0.
+        self._integrator = integrator
+        self._thrust_mapping = thrust_mapping or SigmoidThrust()
         self._actions = range(0, 11)
 
         self._height = height
@@ -71,29 +113,123 @@ class Rocket(object):
         self._exhaust_max_height = 12.5
         self._exhaust_width = 1
         self._exhaust_color = "orange"
+        self._drawables = None
+
+    @property
+    def position(self):
+        return self._pos
+
+    @property
+    def velocity(self):
+        return self._vel
+
+    @property
+    def thrust_percent(self):
+        return self._thrust_percent
+
+    @property
+    def mass(self):
+        return self._mass
+
+    @property
+    def fuel_mass(self):
+        """The remaining fuel in kilograms, or None if fuel is infinite."""
+        return self._fuel_mass
+
+    @property
+    def control_var(self):
+        """The control signal output by the controller on the last update."""
+        return self._control_var
 
     def set_thrust(self, percent):
         """Sets the rocket's thrust."""
         assert int(percent * (len(self._actions) - 1)) in self._actions
         self._thrust_percent = percent
 
-    def _sigmoid(self, x):
-        return 1 / (1 + np.exp(-x))
+    def get_state(self, out=None):
+        """Returns the rocket's dynamic state as a flat float64 array.
+
+        The state does not include the controller's state nor the rocket's
+        constant parameters. Infinite fuel is stored as `np.inf`.
+
+        Args:
+            out: An optional (STATE_SIZE,) array to write the state to.
+        """
+        if out is None:
+            out = np.empty(self.STATE_SIZE)
+        out[0:2] = self._pos
+        out[2:4] = self._vel
+        out[4] = self._thrust_percent
+        out[5] = self._control_var
+        out[6] = self._mass
+        out[7] = np.inf if self._fuel_mass is None else self._fuel_mass
+        return out
+
+    def set_state(self, state):
+        """Restores the state returned by `get_state`."""
+        self._pos[:] = state[0:2]
+        self._vel[:] = state[2:4]
+        self._thrust_percent = float(state[4])
+        self._control_var = float(state[5])
+        self._mass = float(state[6])
+        fuel_mass = float(state[7])
+        self._fuel_mass = None if np.isinf(fuel_mass) else fuel_mass
+
+    def fork(self, state, n, controller=None):
+        """Returns a RocketBatch of n copies of this rocket in the given state.
+
+        Args:
+            state: The flat state returned by `get_state`.
+            n: The number of copies.
+            controller: An optional batch controller to drive the copies, e.g.
+                from the `fork` of this rocket's controller.
+        """
+        states = np.broadcast_to(state, (n, self.STATE_SIZE))
+        fuel_mass = states[:, 7]
+        rockets = RocketBatch(
+                states[:, 0:2],
+                mass=states[:, 6],
+                max_thrust_force=-self._thrust_max_force[1],
+                controller=controller,
+                thrust_mapping=self._thrust_mapping,
+                fuel_mass=None if np.isinf(fuel_mass).all() else fuel_mass,
+                specific_impulse=self._exhaust_velocity / STANDARD_GRAVITY)
+        rockets.set_state(states)
+        return rockets
 
     def update(self, dt):
         """Resolve the forces acting on the rocket and update position."""
         if self._controller:
             control_var = self._controller.tick(self._pos[1], dt)
-            thrust_percent = round(self._sigmoid(-control_var), 1)
-            self.set_thrust(thrust_percent)
+            self._control_var = control_var
+            # The mapping only ever returns valid thrust levels.
+            self._thrust_percent = self._thrust_mapping.percent(control_var)
+        if self._fuel_mass is not None and self._fuel_mass <= 0:
+            self._thrust_percent = 0  # Engine cut-off.
 
         acc = GRAVITY
         if self._thrust_percent:
             thrust_force = self._thrust_max_force * self._thrust_percent
-            thrust_acc = thrust_force / self._mass
+            mass = self._mass
+            if self._fuel_mass is not None:
+                # Thrust is produced by ejecting fuel at the exhaust velocity.
+                # On the last tick, only the remaining fuel can be burned.
+                burn = -thrust_force[1] / self._exhaust_velocity * dt
+                if burn > self._fuel_mass:
+                    thrust_force = thrust_force * (self._fuel_mass / burn)
+                    burn = self._fuel_mass
+                self._fuel_mass -= burn
+                self._mass -= burn
+            thrust_acc = thrust_force / mass
             acc = acc + thrust_acc 
-        self._vel += acc * dt
-        self._pos += self._vel * dt
+        if self._integrator is None:
+            self._vel += acc * dt
+            self._pos += self._vel * dt
+        else:
+            pos, vel = self._integrator.step(
+                    self._pos, self._vel, lambda x, v: acc, dt)
+            self._pos[:] = pos
+            self._vel[:] = vel
 
         # TODO(eugenhotaj): Temporary hack for ground collision. Long term, 
         # figure out what the reacting force is and apply to rocket.
@@ -103,37 +239,635 @@ class Rocket(object):
             self._vel[1] = min(0, self._vel[1])
             
     def drawables(self):
-        """Returns a list of GraphicsObjects necessary to draw the rocket."""
+        """Returns a list of GraphicsObjects necessary to draw the rocket.
+
+        The same GraphicsObjects are returned on every call. Once drawn, they
+        are kept in sync with the rocket by `update_drawables` instead of being
+        undrawn and recreated every frame.
+        """
+        if self._drawables is None:
+            import graphics as g  # Only windowed users need Tk.
+            self._body = g.Polygon(g.Point(0, 0), g.Point(0, 0), g.Point(0, 0))
+            self._exhaust = g.Line(g.Point(0, 0), g.Point(0, 0))
+            self._exhaust.setWidth(self._exhaust_width)  # Do not scale width.
+            self._exhaust.setOutline(self._exhaust_color)
+            self._drawables = [self._body, self._exhaust]
+            self.update_drawables()
+        return self._drawables
+
+    def update_drawables(self, state=None):
+        """Updates the rocket's GraphicsObjects in place to match its state.
+
+        Args:
+            state: An optional state, see `get_state`, to draw instead of the
+                rocket's current state.
+        """
+        if self._drawables is None:
+            return
+        if state is None:
+            x, y = self._pos.tolist()
+            thrust_percent = self._thrust_percent
+        else:
+            x, y, thrust_percent = state[0], state[1], state[4]
         # TODO(eugenhotaj): Remove hardcoded SCALE.
-        drawables = []
-        x, y = self._pos.tolist()
         radius = (self._diameter * SCALE) / 2
         height = self._height * SCALE
-        body = g.Polygon(g.Point(x - radius, y), g.Point(x + radius, y), 
-                         g.Point(x, y - height)) 
-        drawables.append(body)
+        self._body.reshape(x - radius, y, x + radius, y, x, y - height)
 
-        exhaust_height = (self._exhaust_max_height * self._thrust_percent * 
-                          SCALE)
+        exhaust_height = self._exhaust_max_height * thrust_percent * SCALE
         if exhaust_height:
-            exhaust = g.Line(g.Point(x, y),
-                             g.Point(x, y + exhaust_height))
-            exhaust.setWidth(self._exhaust_width)  # Do not scale exhaust width.
-            exhaust.setOutline(self._exhaust_color)
-            drawables.append(exhaust) 
-        return drawables
+            self._exhaust.reshape(x, y, x, y + exhaust_height)
+        self._exhaust.setVisible(bool(exhaust_height))
+
+
+class Trail(object):
+    """A bounded trail of the positions a rocket has been at.
+
+    Positions closer than `spacing` pixels to the last kept one are culled as
+    they arrive, so hovering or slow rockets do not pile up points. The kept
+    points live in a ring buffer of `capacity` points, which forgets the
+    oldest points once full. The trail is drawn as a single polyline whose
+    coordinates are updated in place.
+    """
+
+    def __init__(self, capacity=TRAIL_CAPACITY, spacing=TRAIL_SPACING,
+                 color='gray'):
+        """Initializes a new Trail instance.
+
+        Args:
+            capacity: The maximum number of points kept.
+            spacing: The minimum distance, in pixels, between kept points.
+            color: The color of the trail.
+        """
+        self._capacity = capacity
+        self._spacing_squared = spacing ** 2
+        self._color = color
+        # Every point is written twice, capacity apart, so that the points in
+        # order are always the contiguous slice [start, start + count).
+        self._points = np.empty((2 * capacity, 2))
+        self._start = 0
+        self._count = 0
+        # The last position added, which may have been culled.
+        self._head = np.empty(2)
+        # Scratch space for the kept points followed by the head.
+        self._line_points = np.empty((capacity + 1, 2))
+        self._drawables = None
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def points(self):
+        """The (N, 2) kept points, oldest first. Does not include the head."""
+        return self._points[self._start:self._start + self._count]
+
+    def add(self, position):
+        """Adds the rocket's latest position to the trail."""
+        self._head[:] = position
+        if self._count:
+            last = self._points[self._start + self._count - 1]
+            dx, dy = (self._head - last).tolist()
+            if dx * dx + dy * dy < self._spacing_squared:
+                return
+        i = (self._start + self._count) % self._capacity
+        self._points[i] = self._points[i + self._capacity] = self._head
+        if self._count < self._capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self._capacity
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+
+    def drawables(self):
+        """Returns a list holding the trail's single GraphicsObject."""
+        if self._drawables is None:
+            import graphics as g  # See Rocket.drawables.
+            self._line = g.Polyline(np.zeros((2, 2)))
+            self._line.setOutline(self._color)
+            self._line.setVisible(False)
+            self._drawables = [self._line]
+            self.update_drawables()
+        return self._drawables
+
+    def update_drawables(self):
+        """Updates the trail's polyline in place to end at the head."""
+        if self._drawables is None:
+            return
+        if not self._count:
+            self._line.setVisible(False)
+            return
+        count = self._count
+        line = self._line_points[:count + 1]
+        line[:count] = self.points
+        line[count] = self._head
+        self._line.reshape(line)
+        self._line.setVisible(True)
+
+
+class RocketBatch(object):
+    """A batch of N independent rockets stepped together.
+
+    Simulates the same dynamics as `Rocket` but stores the state of all the
+    rockets in contiguous arrays (struct-of-arrays) so that a tick costs a
+    handful of vectorized operations regardless of the number of rockets.
+    """
+
+    STATE_SIZE = Rocket.STATE_SIZE
+
+    def __init__(self,
+                 pos,
+                 mass=27670.,
+                 max_thrust_force=410000.,
+                 controller=None,
+                 thrust_mapping=None,
+                 gravity=GRAVITY[1],
+                 fuel_mass=None,
+                 specific_impulse=255.):
+        """Initializes a new RocketBatch instance.
+
+        Args:
+            pos: The (N, 2) array of initial (x, y) rocket positions.
+            mass: The initial mass of the rockets in kilograms, including any
+                fuel. Either a scalar shared by all rockets or an array of
+                shape (N,).
+            max_thrust_force: The maximum thrust force at full burn in newtons.
+                Either a scalar shared by all rockets or an array of shape (N,).
+            controller: An optional controller whose `tick` accepts and returns
+                (N,) arrays. Used to drive the rockets' thrust on every update.
+            thrust_mapping: The `thrust.ThrustMapping` which converts the
+                controller's signals to thrust levels. Defaults to
+                `thrust.SigmoidThrust`.
+            gravity: The downward gravitational acceleration. Either a scalar
+                shared by all rockets or an array of shape (N,).
+            fuel_mass: The mass of the fuel in kilograms. Either a scalar
+                shared by all rockets or an array of shape (N,) in which
+                `np.inf` marks rockets with infinite fuel and constant mass.
+                Finite fuel must be at most the rocket's mass. If None, every
+                rocket has infinite fuel and no fuel is tracked.
+            specific_impulse: The engines' specific impulse in seconds. Either
+                a scalar shared by all rockets or an array of shape (N,).
+        """
+        self._pos = np.array(pos, dtype=np.float64).reshape(-1, 2)
+        n = len(self._pos)
+        self._vel = np.zeros((n, 2))
+        self._mass = np.broadcast_to(
+                np.asarray(mass, dtype=np.float64), (n,)).copy()
+        self._thrust_max_force = np.broadcast_to(
+                np.asarray(max_thrust_force, dtype=np.float64), (n,)).copy()
+        self._gravity = np.broadcast_to(
+                np.asarray(gravity, dtype=np.float64), (n,)).copy()
+        self._fuel_mass = None
+        if fuel_mass is not None:
+            self._fuel_mass = np.broadcast_to(
+                    np.asarray(fuel_mass, dtype=np.float64), (n,)).copy()
+            finite = np.isfinite(self._fuel_mass)
+            if ((self._fuel_mass < 0) |
+                    (finite & (self._fuel_mass > self._mass))).any():
+                raise ValueError('fuel_mass must be in [0, mass] or np.inf.')
+            self._exhaust_velocity = np.broadcast_to(
+                    np.asarray(specific_impulse, dtype=np.float64) *
+                    STANDARD_GRAVITY, (n,)).copy()
+            # The fuel burned per second at full thrust.
+            self._max_burn_rate = self._thrust_max_force / self._exhaust_velocity
+            # Rockets with infinite fuel keep a constant mass.
+            self._depletes = None if finite.all() else finite.astype(np.float64)
+            self._initial_mass = self._mass.copy()
+            self._initial_fuel_mass = self._fuel_mass.copy()
+            self._burn = np.empty(n)
+            self._has_fuel = np.empty(n, dtype=bool)
+        self._thrust_percent = np.zeros(n)
+        self._controller = controller
+        self._control_var = np.zeros(n)
+        self._thrust_mapping = thrust_mapping or SigmoidThrust()
+        self._num_actions = 11
+
+        # Scratch space reused every tick to avoid allocations.
+        self._acc = np.empty(n)
+        self._dpos = np.empty((n, 2))
+
+    def __len__(self):
+        return len(self._pos)
+
+    @property
+    def position(self):
+        return self._pos
+
+    @property
+    def velocity(self):
+        return self._vel
+
+    @property
+    def thrust_percent(self):
+        return self._thrust_percent
+
+    @property
+    def mass(self):
+        return self._mass
+
+    @property
+    def fuel_mass(self):
+        """The remaining fuel of every rocket, or None if fuel is infinite."""
+        return self._fuel_mass
+
+    @property
+    def control_var(self):
+        """The control signals output by the controller on the last update."""
+        return self._control_var
+
+    def reset(self, pos, mask=None):
+        """Moves rockets to new positions at rest, refueled, engines off.
+
+        Args:
+            pos: The (x, y) position, or (N, 2) positions, to move to.
+            mask: An optional boolean (N,) array selecting which rockets to
+                reset. All rockets are reset if not provided.
+        """
+        if mask is None:
+            mask = slice(None)
+        elif np.ndim(pos) == 2:
+            pos = np.asarray(pos)[mask]
+        self._pos[mask] = pos
+        self._vel[mask] = 0
+        self._thrust_percent[mask] = 0
+        self._control_var[mask] = 0
+        if self._fuel_mass is not None:
+            self._mass[mask] = self._initial_mass[mask]
+            self._fuel_mass[mask] = self._initial_fuel_mass[mask]
+
+    def get_state(self, out=None):
+        """Returns the (N, STATE_SIZE) states, see `Rocket.get_state`."""
+        if out is None:
+            out = np.empty((len(self), self.STATE_SIZE))
+        out[:, 0:2] = self._pos
+        out[:, 2:4] = self._vel
+        out[:, 4] = self._thrust_percent
+        out[:, 5] = self._control_var
+        out[:, 6] = self._mass
+        out[:, 7] = np.inf if self._fuel_mass is None else self._fuel_mass
+        return out
+
+    def set_state(self, state):
+        """Restores (N, STATE_SIZE) states, or one state for every rocket.
+
+        Raises:
+            ValueError: If the state has finite fuel but the batch was created
+                without fuel_mass.
+        """
+        state = np.asarray(state)
+        if self._fuel_mass is None:
+            if not np.isinf(state[..., 7]).all():
+                raise ValueError('The batch does not track fuel.')
+        else:
+            self._fuel_mass[:] = state[..., 7]
+        self._pos[:] = state[..., 0:2]
+        self._vel[:] = state[..., 2:4]
+        self._thrust_percent[:] = state[..., 4]
+        self._control_var[:] = state[..., 5]
+        self._mass[:] = state[..., 6]
+
+    def set_thrust(self, percent):
+        """Sets every rocket's thrust, quantized to the nearest 10%."""
+        levels = self._num_actions - 1
+        np.multiply(percent, levels, out=self._thrust_percent)
+        np.round(self._thrust_percent, out=self._thrust_percent)
+        np.clip(self._thrust_percent, 0, levels, out=self._thrust_percent)
+        self._thrust_percent /= levels
+
+    def update(self, dt):
+        """Resolves the forces acting on every rocket and updates positions."""
+        if self._controller:
+            control_var = self._controller.tick(self._pos[:, 1], dt)
+            self._control_var[:] = control_var
+            self._thrust_mapping.percents(control_var,
+                                          out=self._thrust_percent)
+
+        # Only thrust and gravity act on the rockets, both vertically.
+        if self._fuel_mass is None:
+            acc = np.multiply(self._thrust_max_force, self._thrust_percent,
+                              out=self._acc)
+        else:
+            # Engine cut-off.
+            np.greater(self._fuel_mass, 0, out=self._has_fuel)
+            np.multiply(self._thrust_percent, self._has_fuel,
+                        out=self._thrust_percent)
+            # See Rocket.update. Thrust is derived from the fuel actually
+            # burned so that the last burn is limited by the remaining fuel.
+            burn = np.multiply(self._max_burn_rate, self._thrust_percent,
+                               out=self._burn)
+            burn *= dt
+            np.minimum(burn, self._fuel_mass, out=burn)
+            self._fuel_mass -= burn
+            acc = np.multiply(burn, self._exhaust_velocity, out=self._acc)
+            acc /= dt
+        acc /= self._mass
+        if self._fuel_mass is not None:
+            if self._depletes is not None:
+                burn *= self._depletes
+            self._mass -= burn
+        np.subtract(self._gravity, acc, out=acc)
+        acc *= dt
+        self._vel[:, 1] += acc
+        self._pos += np.multiply(self._vel, dt, out=self._dpos)
+
+        # See Rocket.update for the ground collision hack.
+        grounded = self._pos[:, 1] >= GROUND_Y
+        self._pos[grounded, 1] = GROUND_Y
+        np.minimum(self._vel[:, 1], 0, out=self._vel[:, 1], where=grounded)
+
+
+class FixedStepClock(object):
+    """A simulation clock which advances in fixed-size steps.
+
+    Real elapsed time is accumulated and converted into a whole number of
+    fixed-size physics steps. Leftover time is carried over to the next frame
+    so the simulation neither drifts nor depends on the frame rate. If a frame
+    takes too long, at most `max_steps` steps are taken and the remaining time
+    is dropped, i.e. the simulation slows down instead of spiraling.
+    """
+
+    # The (accumulator, time) state.
+    STATE_SIZE = 2
+
+    def __init__(self,
+                 step=DT,
+                 max_steps=MAX_STEPS_PER_FRAME,
+                 time_scale=SCALE):
+        """Initializes a new FixedStepClock instance.
+
+        Args:
+            step: The simulated time per physics step.
+            max_steps: The maximum number of steps returned by `advance`.
+            time_scale: The number of simulated seconds per real second.
+        """
+        self._step = step
+        self._max_steps = max_steps
+        self._time_scale = time_scale
+        self._accumulator = 0.
+        self._time = 0.
+
+    @property
+    def step(self):
+        return self._step
+
+    @property
+    def time_scale(self):
+        return self._time_scale
+
+    @property
+    def time(self):
+        """The total simulated time stepped so far."""
+        return self._time
+
+    @property
+    def alpha(self):
+        """The fraction of a step left over in the accumulator, in [0, 1)."""
+        return self._accumulator / self._step
+
+    def get_state(self, out=None):
+        """Returns the clock's state as a flat float64 array."""
+        if out is None:
+            out = np.empty(self.STATE_SIZE)
+        out[0] = self._accumulator
+        out[1] = self._time
+        return out
+
+    def set_state(self, state):
+        """Restores the state returned by `get_state`."""
+        self._accumulator = float(state[0])
+        self._time = float(state[1])
+
+    def advance(self, elapsed):
+        """Accumulates real elapsed time.
+
+        Args:
+            elapsed: The real time, in seconds, since the last call.
+
+        Returns:
+            The number of physics steps the caller should now take.
+        """
+        self._accumulator += elapsed * self._time_scale
+        steps = int(self._accumulator // self._step)
+        if steps > self._max_steps:
+            steps = self._max_steps
+            self._accumulator = 0.
+        else:
+            self._accumulator -= steps * self._step
+        self._time += steps * self._step
+        return steps
+
+
+class StateBuffer(object):
+    """Lock-free exchange of the two most recent states between two threads.
+
+    A single writer publishes flat states which a single reader reads without
+    either of them ever blocking. States are written into one of three slots,
+    so a new state never overwrites the two most recently published ones. A
+    reader which started copying before a publish may still be overtaken, so
+    it retries whenever the sequence number changed while it was copying (a
+    sequence lock). Relies on the GIL for atomic reads and writes of the
+    sequence number.
+    """
+
+    def __init__(self, state):
+        """Initializes a new StateBuffer instance.
+
+        Args:
+            state: The initial flat state. It is published as both the
+                previous and the latest state.
+        """
+        self._slots = np.empty((3, len(state)))
+        self._slots[:] = state
+        self._times = np.full(3, time.perf_counter())
+        self._sequence = 0
+
+    def publish(self, state):
+        """Publishes a new latest state, timestamped with the current time."""
+        sequence = self._sequence + 1
+        i = sequence % 3
+        self._slots[i] = state
+        self._times[i] = time.perf_counter()
+        self._sequence = sequence
+
+    def read(self, out):
+        """Copies the previous and latest states.
+
+        Args:
+            out: The (2, state size) array to write the previous and latest
+                states to.
+
+        Returns:
+            The `time.perf_counter` time at which the latest state was
+            published.
+        """
+        while True:
+            sequence = self._sequence
+            out[0] = self._slots[(sequence - 1) % 3]
+            out[1] = self._slots[sequence % 3]
+            published = self._times[sequence % 3]
+            if self._sequence == sequence:
+                return published
+
+
+class PhysicsThread(threading.Thread):
+    """Steps a rocket in real time on a background thread.
+
+    After every tick, the rocket's state is published to a StateBuffer. The
+    thread never touches Tk, which is not thread safe.
+    """
+
+    def __init__(self, rocket, clock, buffer, profiler=None):
+        """Initializes a new PhysicsThread instance.
+
+        Args:
+            rocket: The Rocket to step. Nothing else may update it while the
+                thread is running.
+            clock: The FixedStepClock which paces the ticks.
+            buffer: The StateBuffer to publish the rocket's state to.
+            profiler: An optional `profiling.FrameProfiler`, used only by this
+                thread. Every wake up is profiled as a frame made of a
+                'physics' phase, which takes the due ticks, and a 'sleep'
+                phase. Its hooks run on this thread.
+        """
+        super(PhysicsThread, self).__init__(daemon=True)
+        self._rocket = rocket
+        self._clock = clock
+        self._buffer = buffer
+        self._profiler = profiler
+        self._stopped = threading.Event()
+
+    def run(self):
+        rocket, clock, profiler = self._rocket, self._clock, self._profiler
+        state = rocket.get_state()
+        t0 = time.perf_counter()
+        while not self._stopped.is_set():
+            t = time.perf_counter()
+            steps = clock.advance(t - t0)
+            t0 = t
+            if profiler is not None:
+                profiler.begin('physics')
+            for _ in range(steps):
+                rocket.update(clock.step)
+                self._buffer.publish(rocket.get_state(state))
+            if profiler is not None:
+                profiler.end('physics')
+                profiler.begin('sleep')
+            # Sleep until the next tick is due.
+            self._stopped.wait(
+                    (1 - clock.alpha) * clock.step / clock.time_scale)
+            if profiler is not None:
+                profiler.end('sleep')
+                profiler.end_frame()
+
+    def stop(self):
+        """Stops the thread and waits for it to finish."""
+        self._stopped.set()
+        self.join()
+
+
+def simulate(rocket, num_ticks, dt=DT, recorder=None):
+    """Steps the rocket as fast as possible without drawing anything.
+
+    Args:
+        rocket: The Rocket to simulate. It is updated in place.
+        num_ticks: The number of ticks to simulate.
+        dt: The elapsed (simulated) time per tick.
+        recorder: An optional `recorder.TrajectoryRecorder` which records the
+            rocket's full state after every tick.
+
+    Returns:
+        A (num_ticks + 1, 2) array holding the rocket's position before the
+        first tick followed by its position after every tick.
+    """
+    trajectory = np.empty((num_ticks + 1, 2))
+    trajectory[0] = rocket.position
+    for i in range(1, num_ticks + 1):
+        rocket.update(dt)
+        trajectory[i] = rocket.position
+        if recorder is not None:
+            recorder.record(i * dt, rocket)
+    return trajectory
 
 
 class Simulation(object):
     """Simulates the Rocket environment."""
 
-    def __init__(self):
-        self._window = g.GraphWin(TITLE, WIDTH, HEIGHT, autoflush=False)       
-        controller = PIDController(setpoint=TARGET_Y, kp=1., ki=.0001, kd=2.3)
-        self._rocket = Rocket(pos=(WIDTH/2, GROUND_Y), controller=controller)
+    def __init__(self, headless=False, profiler=None, show_stats=False,
+                 show_trail=True, physics_profiler=None):
+        """Initializes a new Simulation instance.
+
+        Args:
+            headless: If True, no window is created and the simulation can only
+                be driven through `run_headless`.
+            profiler: An optional `profiling.FrameProfiler` which times the
+                'render' and 'present' phases of every frame on the render
+                thread.
+            show_stats: If True, the profilers' summaries are drawn on screen.
+                Requires a profiler.
+            show_trail: If True, the rocket's trail is drawn behind it.
+            physics_profiler: An optional, separate `profiling.FrameProfiler`
+                which times the 'physics' phase on the PhysicsThread, see
+                `PhysicsThread`. Profilers are not thread safe, so it must not
+                be the same instance as profiler.
+        """
+        if show_stats and profiler is None:
+            raise ValueError('show_stats requires a profiler.')
+        if physics_profiler is not None and physics_profiler is profiler:
+            raise ValueError('physics_profiler must not be the profiler.')
+        self._profiler = profiler
+        self._physics_profiler = physics_profiler
+        self._show_stats = show_stats
+        self._window = None
+        if not headless:
+            import graphics as g  # See Rocket.drawables.
+            self._window = g.GraphWin(TITLE, WIDTH, HEIGHT, autoflush=False)
+        self._controller = PIDController(setpoint=TARGET_Y, kp=1., ki=.0001,
+                                         kd=2.3)
+        self._rocket = Rocket(pos=(WIDTH/2, GROUND_Y),
+                              controller=self._controller)
+        self._clock = FixedStepClock()
+        self._trail = Trail() if show_trail else None
+        # The (start, stop) slices of each component in a snapshot.
+        sizes = np.cumsum((0, self._rocket.STATE_SIZE,
+                           self._controller.STATE_SIZE, self._clock.STATE_SIZE))
+        self._rocket_slice, self._controller_slice, self._clock_slice = (
+                slice(start, stop) for start, stop in zip(sizes, sizes[1:]))
+
+    def snapshot(self):
+        """Returns the full simulation state as one flat float64 array.
+
+        The snapshot holds the rocket's, controller's and clock's states and
+        can be passed to `restore` or `fork`.
+        """
+        snapshot = np.empty(self._clock_slice.stop)
+        self._rocket.get_state(snapshot[self._rocket_slice])
+        self._controller.get_state(snapshot[self._controller_slice])
+        self._clock.get_state(snapshot[self._clock_slice])
+        return snapshot
+
+    def restore(self, snapshot):
+        """Restores the simulation to the state of a `snapshot`."""
+        self._rocket.set_state(snapshot[self._rocket_slice])
+        self._controller.set_state(snapshot[self._controller_slice])
+        self._clock.set_state(snapshot[self._clock_slice])
+
+    def fork(self, snapshot, n):
+        """Returns n copies of the rocket branching off from a `snapshot`.
+
+        Args:
+            snapshot: The state returned by `snapshot`.
+            n: The number of copies.
+
+        Returns:
+            A RocketBatch driven by a batch copy of the controller.
+        """
+        controller = self._controller.fork(snapshot[self._controller_slice], n)
+        return self._rocket.fork(snapshot[self._rocket_slice], n, controller)
 
     def _static_drawables(self):
         """Returns GraphicsObjects that only need to be drawn once."""
+        import graphics as g
         ground = g.Line(g.Point(0, GROUND_Y), g.Point(WIDTH, GROUND_Y))
         target = g.Line(g.Point(WIDTH/2 - 50, TARGET_Y), 
                         g.Point(WIDTH/2 + 50, TARGET_Y))
@@ -141,31 +875,95 @@ class Simulation(object):
         return ground, target
 
     def _draw(self, drawables):
-        for drawable in drawables:
-            drawable.draw(self._window)
+        self._window.drawAll(drawables)
 
-    def _undraw(self, drawables):
-        for drawable in drawables:
-            drawable.undraw()
+    def run_headless(self, num_ticks=None, seconds=None, dt=DT,
+                     recorder=None):
+        """Runs the simulation without a window as fast as possible.
+
+        Exactly one of `num_ticks` or `seconds` must be provided.
+
+        Args:
+            num_ticks: The number of ticks to simulate.
+            seconds: The amount of simulated time to run for. Rounded up to a
+                whole number of ticks.
+            dt: The elapsed (simulated) time per tick.
+            recorder: An optional recorder, see `simulate`.
+
+        Returns:
+            The rocket's trajectory, see `simulate`.
+        """
+        if (num_ticks is None) == (seconds is None):
+            raise ValueError('Exactly one of num_ticks or seconds is required.')
+        if num_ticks is None:
+            num_ticks = int(np.ceil(seconds / dt))
+        return simulate(self._rocket, num_ticks, dt, recorder)
 
     def run(self):
-        """Runs the simulation until the user closes out."""
+        """Runs the simulation until the user closes out.
+
+        Physics runs at a fixed rate on a PhysicsThread, independently of how
+        long drawing takes. Every frame, the two most recently published
+        states are interpolated and drawn, which keeps motion smooth even
+        when there are fewer physics ticks than frames. The drawn state lags
+        the physics by at most one tick.
+        """
+        if self._window is None:
+            raise RuntimeError('Headless simulations must use run_headless.')
+        import graphics as g
         self._draw(self._static_drawables())
-        dynamic_drawables = []
-        t0 = time.time()
-        while self._window.isOpen():
-            # Resolve time since last tick.
-            t = time.time()
-            dt = (t - t0) * SCALE
-            t0 = t
+        if self._trail is not None:
+            self._draw(self._trail.drawables())
+        self._draw(self._rocket.drawables())
+        stats = None
+        if self._show_stats:
+            stats = g.Text(g.Point(WIDTH - 120, 50), '')
+            stats.setSize(8)
+            stats.draw(self._window)
+
+        buffer = StateBuffer(self._rocket.get_state())
+        tick = self._clock.step / self._clock.time_scale  # In real seconds.
+        physics = PhysicsThread(self._rocket, self._clock, buffer,
+                                self._physics_profiler)
+        physics.start()
+        try:
+            self._render_loop(buffer, tick, stats)
+        finally:
+            physics.stop()
 
-            # Run simulation for 1 tick.
-            self._undraw(dynamic_drawables)
-            dynamic_drawables = []
-            self._rocket.update(dt)
-            dynamic_drawables.extend(self._rocket.drawables())
-            self._draw(dynamic_drawables)
+    def _render_loop(self, buffer, tick, stats):
+        """Draws interpolated states from the buffer until the window closes.
+        """
+        import graphics as g
+        profiler = self._profiler
+        states = np.empty((2, self._rocket.STATE_SIZE))
+        state = np.empty(self._rocket.STATE_SIZE)
+        while self._window.isOpen():
+            if profiler is not None:
+                profiler.begin('render')
+            published = buffer.read(states)
+            alpha = min((time.perf_counter() - published) / tick, 1.)
+            previous, latest = states
+            state[:] = latest
+            state[0:2] = previous[0:2] + alpha * (latest[0:2] - previous[0:2])
+            self._rocket.update_drawables(state)
+            if self._trail is not None:
+                self._trail.add(state[0:2])
+                self._trail.update_drawables()
+            if stats is not None and profiler.frame_count % (FPS // 2) == 0:
+                summary = profiler.summary()
+                if self._physics_profiler is not None:
+                    # Only reads the physics thread's windows, which at worst
+                    # yields slightly stale statistics.
+                    summary += '\n' + self._physics_profiler.summary()
+                stats.setText(summary)
+            if profiler is not None:
+                profiler.end('render')
+                profiler.begin('present')
             g.update(FPS)  # Enforce FPS.
+            if profiler is not None:
+                profiler.end('present')
+                profiler.end_frame()
 
 if __name__ == '__main__':
     Simulation().run()
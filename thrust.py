@@ -0,0 +1,94 @@
+"""Mappings from control signals to quantized thrust levels.
+
+Controllers output control signals in (-inf, inf) which rockets need to
+convert to one of their NUM_LEVELS evenly spaced thrust levels. Conceptually
+the signal is squashed into [0, 1] by a monotonic function and rounded to the
+nearest level. Since the function is monotonic, the rounding boundaries can
+be mapped back to control signal breakpoints once, up front. Each conversion
+is then just a binary search over the breakpoints, with no transcendental
+function calls.
+
+As in `simulator.Rocket`, negative control signals mean more thrust.
+"""
+
+import abc
+import bisect
+import math
+
+import numpy as np
+
+NUM_LEVELS = 11
+
+
+class ThrustMapping(object):
+    """Abstract mapping meant to be subclassed by all thrust mappings."""
+
+    def __init__(self, num_levels=NUM_LEVELS):
+        """Initializes a new ThrustMapping instance.
+
+        Args:
+            num_levels: The number of evenly spaced thrust levels in [0, 1].
+        """
+        steps = num_levels - 1
+        # The squashed values at which rounding moves up a level.
+        boundaries = [(k + .5) / steps for k in range(steps)]
+        self._breakpoints = [self._inverse(p) for p in boundaries]
+        self._breakpoints_array = np.array(self._breakpoints)
+        self._percents = [k / steps for k in range(num_levels)]
+        self._percents_array = np.array(self._percents)
+
+    @abc.abstractmethod
+    def _inverse(self, p):
+        """Returns the signal which the squashing function maps to p.
+
+        Must be overridden by the subclass.
+        """
+
+    def percent(self, control_var):
+        """Returns the thrust percent for a single control signal."""
+        return self._percents[
+                bisect.bisect_right(self._breakpoints, -control_var)]
+
+    def percents(self, control_var, out=None):
+        """Returns the thrust percents for an array of control signals.
+
+        Args:
+            control_var: The array of control signals.
+            out: An optional array of the same shape to write the result to.
+        """
+        levels = np.searchsorted(self._breakpoints_array,
+                                 np.negative(control_var), side='right')
+        return np.take(self._percents_array, levels, out=out)
+
+
+class SigmoidThrust(ThrustMapping):
+    """Squashes control signals with the logistic sigmoid."""
+
+    def _inverse(self, p):
+        return math.log(p / (1 - p))
+
+
+class TanhThrust(ThrustMapping):
+    """Squashes control signals with (1 + tanh(x / scale)) / 2."""
+
+    def __init__(self, scale=1., num_levels=NUM_LEVELS):
+        self._scale = scale
+        super(TanhThrust, self).__init__(num_levels=num_levels)
+
+    def _inverse(self, p):
+        return self._scale * math.atanh(2 * p - 1)
+
+
+class LinearThrust(ThrustMapping):
+    """Maps control signals linearly, saturating at no and full thrust.
+
+    A signal of 0 maps to half thrust and signals of magnitude scale / 2 or
+    more saturate.
+    """
+
+    def __init__(self, scale=1., num_levels=NUM_LEVELS):
+        self._scale = scale
+        super(LinearThrust, self).__init__(num_levels=num_levels)
+
+    def _inverse(self, p):
+        return self._scale * (p - .5)
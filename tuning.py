@@ -0,0 +1,247 @@
+"""Automatic PID gain tuning on headless rocket rollouts.
+
+Candidate gains are scored by simulating a rocket lifting off from the ground
+and trying to hover at the target. Rollouts are independent so they are spread
+over a process pool which uses every core by default.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import itertools
+import os
+
+import numpy as np
+
+import simulator as sim
+from controller import PIDController
+
+# How close, as a fraction of the initial error, the rocket must stay to the
+# target to be considered settled.
+SETTLING_BAND = .02
+# The fraction of the rollout at the end used to measure steady-state error.
+STEADY_STATE_FRACTION = .1
+# Rollouts are terminated early if the rocket flies this far past the target,
+# as a multiple of the initial error.
+ABORT_OVERSHOOT = 1.
+
+# The score given to rollouts which were terminated early.
+ABORT_SCORE = np.inf
+
+Metrics = collections.namedtuple(
+        'Metrics', ['score', 'settling_time', 'overshoot',
+                    'steady_state_error', 'thrust_effort', 'aborted'])
+
+
+def _score(settling_time, overshoot, steady_state_error, thrust_effort):
+    """Combines the rollout metrics into a single score (lower is better).
+
+    Overshoot and steady-state error are measured as fractions of the initial
+    error so that all terms are roughly on the same scale as settling time.
+    """
+    return (settling_time +
+            10 * overshoot +
+            100 * steady_state_error +
+            thrust_effort)
+
+
+def evaluate(gains, seconds=60., dt=sim.DT):
+    """Scores PID gains on a single headless rollout.
+
+    Args:
+        gains: The (kp, ki, kd) tuple of gains to evaluate.
+        seconds: The amount of simulated time to run the rollout for.
+        dt: The elapsed (simulated) time per tick.
+
+    Returns:
+        The rollout Metrics.
+    """
+    kp, ki, kd = gains
+    controller = PIDController(setpoint=sim.TARGET_Y, kp=kp, ki=ki, kd=kd)
+    rocket = sim.Rocket(pos=(sim.WIDTH/2, sim.GROUND_Y), controller=controller)
+
+    initial_error = abs(sim.GROUND_Y - sim.TARGET_Y)
+    band = SETTLING_BAND * initial_error
+    num_ticks = int(np.ceil(seconds / dt))
+    steady_state_tick = int(num_ticks * (1 - STEADY_STATE_FRACTION))
+
+    settling_tick = 0
+    min_y = sim.GROUND_Y
+    thrust_total = 0.
+    steady_state_total = 0.
+    for tick in range(1, num_ticks + 1):
+        rocket.update(dt)
+        y = float(rocket.position[1])
+        error = abs(sim.TARGET_Y - y)
+        if error > band:
+            settling_tick = tick
+        min_y = min(min_y, y)
+        thrust_total += rocket.thrust_percent
+        if tick > steady_state_tick:
+            steady_state_total += error
+        # Terminate clearly bad candidates early.
+        if sim.TARGET_Y - y > ABORT_OVERSHOOT * initial_error:
+            return Metrics(score=ABORT_SCORE, settling_time=seconds,
+                           overshoot=(sim.TARGET_Y - y) / initial_error,
+                           steady_state_error=error / initial_error,
+                           thrust_effort=thrust_total / tick, aborted=True)
+
+    settling_time = settling_tick * dt
+    overshoot = max(0, sim.TARGET_Y - min_y) / initial_error
+    steady_state_error = (steady_state_total /
+                          (num_ticks - steady_state_tick) / initial_error)
+    thrust_effort = thrust_total / num_ticks
+    score = _score(settling_time, overshoot, steady_state_error, thrust_effort)
+    return Metrics(score=score, settling_time=settling_time,
+                   overshoot=overshoot, steady_state_error=steady_state_error,
+                   thrust_effort=thrust_effort, aborted=False)
+
+
+class Tuner(object):
+    """Searches PID gain space for the best scoring gains.
+
+    All search methods return results as (gains, Metrics) tuples. The tuner
+    owns a process pool so it should be closed (or used as a context manager)
+    once it is no longer needed.
+    """
+
+    def __init__(self, seconds=60., dt=sim.DT, max_workers=None):
+        """Initializes a new Tuner instance.
+
+        Args:
+            seconds: The amount of simulated time to run each rollout for.
+            dt: The elapsed (simulated) time per tick.
+            max_workers: The number of worker processes. Defaults to the
+                number of cores.
+        """
+        self._evaluate = functools.partial(evaluate, seconds=seconds, dt=dt)
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self._max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown()
+
+    def evaluate_all(self, candidates):
+        """Evaluates all candidate gains in parallel.
+
+        Returns:
+            The list of (gains, Metrics) tuples in the same order as the
+            candidates.
+        """
+        candidates = [tuple(float(g) for g in gains) for gains in candidates]
+        chunksize = max(1, len(candidates) // (4 * self._max_workers))
+        metrics = self._executor.map(
+                self._evaluate, candidates, chunksize=chunksize)
+        return list(zip(candidates, metrics))
+
+    def _sorted(self, results):
+        return sorted(results, key=lambda result: result[1].score)
+
+    def grid_search(self, kp, ki, kd):
+        """Evaluates every combination of the given gain values.
+
+        Args:
+            kp: The sequence of proportional gains to try.
+            ki: The sequence of integral gains to try.
+            kd: The sequence of derivative gains to try.
+
+        Returns:
+            The results sorted from best to worst.
+        """
+        return self._sorted(self.evaluate_all(itertools.product(kp, ki, kd)))
+
+    def random_search(self, bounds, num_samples, seed=None):
+        """Evaluates gains sampled uniformly at random.
+
+        Args:
+            bounds: The ((kp_low, kp_high), (ki_low, ki_high),
+                (kd_low, kd_high)) bounds to sample from.
+            num_samples: The number of candidates to evaluate.
+            seed: The seed of the random number generator.
+
+        Returns:
+            The results sorted from best to worst.
+        """
+        low, high = np.array(bounds, dtype=np.float64).T
+        rng = np.random.default_rng(seed)
+        candidates = rng.uniform(low, high, size=(num_samples, 3))
+        return self._sorted(self.evaluate_all(candidates))
+
+    def nelder_mead(self, x0, bounds=None, step=.1, max_iterations=100,
+                    tolerance=1e-6):
+        """Minimizes the score using the Nelder-Mead simplex method.
+
+        To make use of the process pool, every iteration speculatively
+        evaluates the reflected, expanded and both contracted points at once.
+
+        Args:
+            x0: The initial (kp, ki, kd) gains.
+            bounds: Optional bounds, see `random_search`. Points outside the
+                bounds are clipped.
+            step: The relative size of the initial simplex.
+            max_iterations: The maximum number of iterations to run.
+            tolerance: Stop once the scores in the simplex are within
+                tolerance of each other.
+
+        Returns:
+            The best (gains, Metrics) tuple found.
+        """
+        low, high = -np.inf, np.inf
+        if bounds is not None:
+            low, high = np.array(bounds, dtype=np.float64).T
+
+        x0 = np.array(x0, dtype=np.float64)
+        simplex = [x0]
+        for i in range(len(x0)):
+            x = x0.copy()
+            x[i] = x[i] * (1 + step) if x[i] else step
+            simplex.append(np.clip(x, low, high))
+        results = self.evaluate_all(simplex)
+
+        for _ in range(max_iterations):
+            results = self._sorted(results)
+            scores = [metrics.score for _, metrics in results]
+            if np.isfinite(scores[0]) and scores[-1] - scores[0] < tolerance:
+                break
+
+            points = [np.array(gains) for gains, _ in results]
+            centroid = np.mean(points[:-1], axis=0)
+            worst = points[-1]
+            candidates = [centroid + (centroid - worst),   # Reflection.
+                          centroid + 2 * (centroid - worst),  # Expansion.
+                          centroid + .5 * (centroid - worst),  # Outside.
+                          centroid - .5 * (centroid - worst)]  # Inside.
+            candidates = [np.clip(x, low, high) for x in candidates]
+            reflected, expanded, outside, inside = self.evaluate_all(candidates)
+
+            r = reflected[1].score
+            if r < scores[0]:
+                results[-1] = expanded if expanded[1].score < r else reflected
+            elif r < scores[-2]:
+                results[-1] = reflected
+            elif r < scores[-1] and outside[1].score <= r:
+                results[-1] = outside
+            elif inside[1].score < scores[-1]:
+                results[-1] = inside
+            else:
+                # Shrink towards the best point.
+                best = points[0]
+                shrunk = [best + .5 * (x - best) for x in points[1:]]
+                results = results[:1] + self.evaluate_all(shrunk)
+        return self._sorted(results)[0]
+
+
+if __name__ == '__main__':
+    with Tuner() as tuner:
+        bounds = ((0., 5.), (0., .001), (0., 10.))
+        gains, metrics = tuner.random_search(bounds, num_samples=64)[0]
+        gains, metrics = tuner.nelder_mead(gains, bounds=bounds)
+        print('kp={:.4f} ki={:.6f} kd={:.4f}'.format(*gains))
+        print(metrics)